@@ -0,0 +1,145 @@
+#!python3
+
+# Classifies all rooms of the model (or the selected ones) in one request to the
+# Flask server, shows the predictions for review and writes the accepted ones
+# in a single transaction. Uses the same CPython setup as NUF_by_Name, and
+# like it WinForms for dialogs: pyrevit.forms is WPF/IronPython only.
+
+import sys
+import clr
+
+sys.path.append(r"C:\Users\poletkina\AppData\Local\Programs\Python\Python38\Lib\site-packages")
+sys.path.append(r"C:\Users\poletkina\AppData\Local\Programs\Python\Python38\Lib")
+
+clr.AddReference('RevitAPI')
+clr.AddReference('RevitAPIUI')
+
+from Autodesk.Revit import DB
+from Autodesk.Revit.DB import FilteredElementCollector as FEC
+
+clr.AddReference('System.Windows.Forms')
+from System.Windows.Forms import (Button, CheckedListBox, DialogResult, DockStyle, FlowDirection,
+                                  FlowLayoutPanel, Form, FormStartPosition, Label, ListBox,
+                                  MessageBox, MessageBoxButtons, MessageBoxIcon)
+
+from Snippets._nuf_batch import RoomAdapter, apply_predictions, classify_rooms
+from Snippets._nuf_client import NufClient
+
+doc = __revit__.ActiveUIDocument.Document
+uidoc = __revit__.ActiveUIDocument
+
+PARAMETER_NAME = 'Comments'  # Adjust name as needed
+
+
+class RevitRoomAdapter(RoomAdapter):
+    def __init__(self, doc, uidoc, parameter_name):
+        self.doc = doc
+        self.uidoc = uidoc
+        self.parameter_name = parameter_name
+
+    def collect_rooms(self):
+        room_category_id = DB.ElementId(DB.BuiltInCategory.OST_Rooms).IntegerValue
+        selected = [self.doc.GetElement(element_id)
+                    for element_id in self.uidoc.Selection.GetElementIds()]
+        rooms = [element for element in selected
+                 if element.Category and element.Category.Id.IntegerValue == room_category_id]
+        if not rooms:
+            rooms = FEC(self.doc).OfCategory(DB.BuiltInCategory.OST_Rooms) \
+                .WhereElementIsNotElementType().ToElements()
+        # unplaced rooms have no location and are skipped
+        return [room for room in rooms if room.Location is not None]
+
+    def room_name(self, room):
+        return room.Parameter[DB.BuiltInParameter.ROOM_NAME].AsString()
+
+    def apply(self, assignments):
+        updated = 0
+        transaction = DB.Transaction(self.doc, 'NUF batch application')
+        try:
+            transaction.Start()
+            for room, value in assignments:
+                parameter = room.LookupParameter(self.parameter_name)
+                if parameter and not parameter.IsReadOnly:
+                    parameter.Set(value)
+                    updated += 1
+            transaction.Commit()
+        except Exception as e:
+            print("Error during transaction:", e)
+            transaction.RollBack()
+            return 0
+        return updated
+
+
+def review(predictions, parameter_name):
+    """
+    Checked list of the answered names (all checked) with the names nobody
+    could answer listed below it. Returns the checked predictions, None if
+    the user canceled.
+    """
+    answered = [prediction for prediction in predictions if prediction.answered]
+    unanswered = [prediction for prediction in predictions if not prediction.answered]
+
+    form = Form()
+    form.Text = 'NUF predictions (least confident first) - uncheck to skip'
+    form.Width = 900
+    form.Height = 600
+    form.StartPosition = FormStartPosition.CenterScreen
+
+    # docked controls are laid out from the last added one inwards
+    checked_list = CheckedListBox()
+    checked_list.Dock = DockStyle.Fill
+    checked_list.CheckOnClick = True
+    for prediction in answered:
+        checked_list.Items.Add(prediction.label, True)
+    form.Controls.Add(checked_list)
+
+    if unanswered:
+        unanswered_list = ListBox()
+        unanswered_list.Dock = DockStyle.Bottom
+        unanswered_list.Height = 120
+        for prediction in unanswered:
+            unanswered_list.Items.Add(prediction.label)
+        form.Controls.Add(unanswered_list)
+        unanswered_label = Label()
+        unanswered_label.Dock = DockStyle.Bottom
+        unanswered_label.Text = '{} name(s) without an answer, not applied:'.format(len(unanswered))
+        form.Controls.Add(unanswered_label)
+
+    buttons = FlowLayoutPanel()
+    buttons.Dock = DockStyle.Bottom
+    buttons.Height = 40
+    buttons.FlowDirection = FlowDirection.RightToLeft
+    cancel_button = Button()
+    cancel_button.Text = 'Cancel'
+    cancel_button.DialogResult = DialogResult.Cancel
+    apply_button = Button()
+    apply_button.Text = 'Apply to {}'.format(parameter_name)
+    apply_button.AutoSize = True
+    apply_button.DialogResult = DialogResult.OK
+    apply_button.Enabled = bool(answered)
+    buttons.Controls.Add(cancel_button)
+    buttons.Controls.Add(apply_button)
+    form.Controls.Add(buttons)
+    form.AcceptButton = apply_button
+    form.CancelButton = cancel_button
+
+    if form.ShowDialog() != DialogResult.OK:
+        return None
+    return [answered[index] for index in checked_list.CheckedIndices]
+
+
+adapter = RevitRoomAdapter(doc, uidoc, PARAMETER_NAME)
+predictions = classify_rooms(adapter, NufClient())
+
+if not predictions:
+    MessageBox.Show('No named rooms to classify.', 'NUF Batch',
+                    MessageBoxButtons.OK, MessageBoxIcon.Information)
+    sys.exit()
+
+accepted = review(predictions, PARAMETER_NAME)
+
+if accepted:
+    updated = apply_predictions(adapter, accepted)
+    print("{} room(s) updated with their NUF class.".format(updated))
+else:
+    print("Operation canceled by the user.")
@@ -27,8 +27,9 @@ from System.Windows.Forms import DialogResult, MessageBox, MessageBoxButtons, Me
 
 import pyrevit
 
-import requests
-import json 
+import json
+
+from Snippets._nuf_client import NufClient
 
 uiapp = __revit__
 doc = __revit__.ActiveUIDocument.Document
@@ -40,28 +41,23 @@ room_ref = uidoc.Selection.PickObject(ObjectType.Element, "Pick an element")
 name = doc.GetElement(room_ref.ElementId).LookupParameter('Name').AsString()
 name_to_model = name.lower() # Model is case sensitive , was trained on lower case
 
-url = "http://127.0.0.1:5002/predict"
-data = {
-    "text": name_to_model  # The room name you'd like to classify
-}
-response = requests.post(url, json=data)
-
-if response.status_code == 200:
-    response_json = response.json()
-    if "all_class_scores" in response_json:
-        response_json["all_class_scores"] = {
-            key: round(value, 3) for key, value in response_json["all_class_scores"].items()
-        }
-
-    formatted_response = json.dumps(response_json, indent=4, ensure_ascii=False)
-    print("Response from model:\n", formatted_response)
-else:
-    print(f"Error: Received status code {response.status_code} from the model server.")
-    print("Response text:", response.text)
+client = NufClient()
+response_json = client.predict(name_to_model)
+
+if response_json is None:
+    print("No prediction: the model server is not reachable and the name is not in the catalogue.")
+    sys.exit()
+
+if "all_class_scores" in response_json:
+    response_json = dict(response_json, all_class_scores={
+        key: round(value, 3) for key, value in response_json["all_class_scores"].items()
+    })
 
+formatted_response = json.dumps(response_json, indent=4, ensure_ascii=False)
+print("Response from model:\n", formatted_response)
 
-predicted_class = response.json()['predicted_class']
-confidence_percentage = response.json()['confidence_percentage']
+predicted_class = response_json['predicted_class']
+confidence_percentage = response_json['confidence_percentage']
 
 result = MessageBox.Show(
     f"Room Name: {name}\nPredicted Class: {predicted_class}\nConfidence: {confidence_percentage}\nDo you want to apply this to the Comments parameter?",
@@ -85,5 +81,8 @@ if result == DialogResult.Yes:
     except Exception as e:
         print("Error during transaction:", e)
         transaction.RollBack()
+    else:
+        # the confirmed name becomes a training example for its class
+        client.feedback(name_to_model, predicted_class)
 else:
     print("Operation canceled by the user.")
@@ -0,0 +1,118 @@
+# -*- coding: utf-8 -*-
+
+'''
+Per-document element indexes used by Snippets._functions.
+
+The builders only use attributes of the elements passed in and have no
+Revit or clr imports, so they run (and are tested) with plain stand-in
+objects outside Revit.
+'''
+
+
+def document_key(doc):
+    '''key of a document in per-document caches'''
+    get_hash_code = getattr(doc, 'GetHashCode', None)
+    return get_hash_code() if get_hash_code else id(doc)
+
+
+def build_door_room_index(doors, phase):
+    '''
+    Maps room ids (IntegerValue) to the doors leading from / to the room
+    in the given phase: {room_id: {'from': [doors], 'to': [doors]}}.
+    Doors without a bounding box are skipped.
+    Works on any objects with FromRoom[phase], ToRoom[phase],
+    Id.IntegerValue and get_BoundingBox(None).
+    '''
+    index = {}
+    for door in doors:
+        if door.get_BoundingBox(None) is None:
+            continue
+        for key, room in (('from', door.FromRoom[phase]), ('to', door.ToRoom[phase])):
+            if room:
+                index.setdefault(room.Id.IntegerValue, {'from': [], 'to': []})[key].append(door)
+    return index
+
+
+def build_element_name_index(elements, name_of):
+    '''
+    Maps names to the elements with that name, in collector order:
+    {name: [elements]}. name_of(element) returns the name of an element,
+    so the index can be built from any objects.
+    '''
+    index = {}
+    for element in elements:
+        index.setdefault(name_of(element), []).append(element)
+    return index
+
+
+def _same_object(cached, other):
+    '''identity, or .NET equality of a still valid object'''
+    if cached is other:
+        return True
+    if not getattr(cached, 'IsValidObject', True):
+        return False
+    equals = getattr(cached, 'Equals', None)
+    return bool(equals and equals(other))
+
+
+class DocumentCache(object):
+    '''
+    Indexes per document and key, built on first use.
+
+    The entries of a document are dropped when Revit reports a change to it
+    (Application.DocumentChanged) or closes it (Application.DocumentClosing),
+    so a persistent engine never answers from an edited or reopened model.
+    An entry is also rebuilt when a different or closed document object
+    turns up under the same document key.
+
+    The handlers are only subscribed while the cache holds entries. pyRevit
+    loads the lib modules again for every button run, so a cache of an
+    earlier run unsubscribes (and is released) once its documents changed
+    or closed instead of staying on the Application for the whole session.
+    '''
+
+    def __init__(self):
+        self._entries = {}
+        self._watched = []
+        # the same bound methods for += and -=
+        self._changed_handler = self._on_document_changed
+        self._closing_handler = self._on_document_closing
+
+    def get(self, doc, key, build):
+        '''the index of doc and key, build() creates it if there is none'''
+        cache_key = (document_key(doc), key)
+        entry = self._entries.get(cache_key)
+        if entry is None or not _same_object(entry[0], doc):
+            entry = (doc, build())
+            self._entries[cache_key] = entry
+            self._watch(getattr(doc, 'Application', None))
+        return entry[1]
+
+    def invalidate(self, doc=None, key=None):
+        '''drops the entries of one document / key, or all of them'''
+        doc_key = document_key(doc) if doc is not None else None
+        for cache_key in list(self._entries):
+            if (doc_key is None or cache_key[0] == doc_key) and \
+                    (key is None or cache_key[1] == key):
+                del self._entries[cache_key]
+        if not self._entries:
+            self._unwatch()
+
+    def _watch(self, application):
+        if application is None or any(_same_object(watched, application) for watched in self._watched):
+            return
+        application.DocumentChanged += self._changed_handler
+        application.DocumentClosing += self._closing_handler
+        self._watched.append(application)
+
+    def _unwatch(self):
+        for application in self._watched:
+            application.DocumentChanged -= self._changed_handler
+            application.DocumentClosing -= self._closing_handler
+        self._watched = []
+
+    def _on_document_changed(self, sender, args):
+        self.invalidate(args.GetDocument())
+
+    def _on_document_closing(self, sender, args):
+        self.invalidate(args.Document)
@@ -15,6 +15,8 @@ from Autodesk.Revit.DB import FilteredElementCollector as FEC
 from System.Collections.Generic import List
 from Autodesk.Revit.UI import Selection as SEL
 
+from Snippets._element_indexes import DocumentCache, build_door_room_index, build_element_name_index
+
 uiapp = __revit__
 doc = __revit__.ActiveUIDocument.Document
 uidoc = __revit__.ActiveUIDocument
@@ -66,23 +68,49 @@ def to_list(element, list_type=None):
             return typed_list
     return element
 
-def group_by_key(elements, key_type='Type'):
-    elements = flatten(elements)
+_BUILT_IN_CATEGORIES = None
+
+def get_built_in_category(category_id):
+    '''
+    BuiltInCategory of an integer category id, None for user categories.
+    The id -> BuiltInCategory map is built once on first use.
+    '''
+    global _BUILT_IN_CATEGORIES
+    if _BUILT_IN_CATEGORIES is None:
+        _BUILT_IN_CATEGORIES = dict(
+            (int(b_category), b_category)
+            for b_category in DB.BuiltInCategory.GetValues(DB.BuiltInCategory)
+        )
+    return _BUILT_IN_CATEGORIES.get(category_id)
+
+def get_element_built_in_category(element):
+    category = element.Category
+    if category is not None:
+        return get_built_in_category(category.Id.IntegerValue)
+
+def group_by(elements, key_func, count=False):
+    '''
+    Groups elements by key_func(element) in a single pass.
+    Returns {key: [elements]} or {key: number of elements} if count is True
+    '''
     element_groups = {}
     for element in elements:
-        if key_type == 'Type':
-            key = type(element)
-        elif key_type == 'Category':
-            for key in DB.BuiltInCategory.GetValues(DB.BuiltInCategory):
-                if int(key) == element.Category.Id.IntegerValue:
-                    break
+        key = key_func(element)
+        if count:
+            element_groups[key] = element_groups.get(key, 0) + 1
         else:
-            key = 'Unknown Key'
-        if key not in element_groups:
-            element_groups[key] = []
-        element_groups[key].append(element)
+            element_groups.setdefault(key, []).append(element)
     return element_groups
 
+_GROUP_KEYS = {
+    'Type': type,
+    'Category': get_element_built_in_category,
+}
+
+def group_by_key(elements, key_type='Type', count=False):
+    key_func = _GROUP_KEYS.get(key_type, lambda element: 'Unknown Key')
+    return group_by(flatten(elements), key_func, count)
+
 # working with parameters
 
 def create_parameter_binding(doc, categories, is_type_binding=False):
@@ -176,7 +204,61 @@ def to_proto_type(elements, of_type=None):
 
 # working with elements
 
-def view_exists(doc, view_name):
+def _get_element_family_name(doc, element):
+    element_type = element if isinstance(element, DB.ElementType) \
+        else doc.GetElement(element.GetTypeId())
+    return element_type.FamilyName if element_type else None
+
+class ElementNameIndex(object):
+    '''
+    Name index of all elements of one class in a document, built on first
+    use and shared by get_element_by_name and view_exists with use_index=True.
+    Indexes are dropped when the document changes or closes (DocumentCache),
+    which Revit reports when a transaction is committed: within an open
+    transaction call ElementNameIndex.invalidate(doc) after elements were
+    created, renamed or deleted, or refresh() on a single index.
+    '''
+    _instances = DocumentCache()
+
+    def __init__(self, doc, element_class):
+        self.doc = doc
+        self.element_class = element_class
+        self.refresh()
+
+    @classmethod
+    def get(cls, doc, element_class):
+        return cls._instances.get(doc, element_class, lambda: cls(doc, element_class))
+
+    @classmethod
+    def invalidate(cls, doc=None, element_class=None):
+        '''drops the indexes of one document / class, or all of them'''
+        cls._instances.invalidate(doc, element_class)
+
+    def refresh(self):
+        self._by_name = build_element_name_index(
+            FEC(self.doc).OfClass(self.element_class),
+            DB.Element.Name.GetValue
+        )
+
+    def __contains__(self, name):
+        return bool(self.find(name))
+
+    def find(self, name, family_name=None):
+        '''elements with the given name, optionally of the given family'''
+        elements = self._by_name.get(name, [])
+        if not all(getattr(element, 'IsValidObject', True) for element in elements):
+            # elements were deleted since the index was built
+            self.refresh()
+            elements = self._by_name.get(name, [])
+        if family_name is None:
+            return elements
+        return [element for element in elements
+                if _get_element_family_name(self.doc, element) == family_name]
+
+def view_exists(doc, view_name, use_index=False):
+    '''use_index - answer from ElementNameIndex, for many lookups outside a transaction'''
+    if use_index:
+        return view_name in ElementNameIndex.get(doc, DB.View)
     views = FEC(doc).OfClass(DB.View).ToElements()
     for view in views:
         if view.Name == view_name:
@@ -229,7 +311,8 @@ def get_element_by_name(
         name,
         element_class,
         family_name=None,
-        return_all_elements=False):
+        return_all_elements=False,
+        use_index=False):
     '''
     Получение элементов Revit по имени
     doc - документ Revit
@@ -239,31 +322,64 @@ def get_element_by_name(
     return_all_elements - вернуть все найденные элементы
         False - возвращается лишь первый найденный элемент
         True - возвращается полный список найденных элементов
+    use_index - искать по ElementNameIndex вместо полного перебора
+        (для множества запросов; внутри открытой транзакции не видит
+        созданные и переименованные элементы, см. ElementNameIndex)
     '''
-    elements = []
-    for element in FEC(doc).OfClass(element_class):
-        if DB.Element.Name.GetValue(element) != name:
-            continue
+    if use_index:
+        elements = ElementNameIndex.get(doc, element_class).find(name, family_name)
+    else:
+        elements = [element for element in FEC(doc).OfClass(element_class)
+                    if DB.Element.Name.GetValue(element) == name]
         if family_name is not None:
-            element_type = element if isinstance(element, DB.ElementType) \
-                else doc.GetElement(element.GetTypeId())
-            element_family_name = element_type.FamilyName if element_type \
-                else None
-            if element_family_name != family_name:
-                continue
-        elements.append(element)
+            elements = [element for element in elements
+                        if _get_element_family_name(doc, element) == family_name]
     if elements:
         return elements if return_all_elements else elements[0]
 
 class CategoriesSelectionFilter(SEL.ISelectionFilter):
     def __init__(self, b_categories):
         super(CategoriesSelectionFilter, self).__init__()
-        self._category_ids = [DB.ElementId(b_category)
-                              for b_category in to_list(b_categories)]
+        self._categories = set(get_built_in_category(int(b_category))
+                               for b_category in to_list(b_categories))
+        self._categories.discard(None)
 
     def AllowElement(self, element):
-        return element.Category.Id in self._category_ids
-    
+        return get_element_built_in_category(element) in self._categories
+
+# working with doors
+
+class DoorRoomIndex(object):
+    '''
+    Door to room index of one document and phase, built once and shared
+    by all RoomAntiRutinaField instances. Indexes are dropped when the
+    document changes or closes (DocumentCache); within an open transaction
+    call DoorRoomIndex.invalidate(doc) after doors or rooms were changed.
+    '''
+    _instances = DocumentCache()
+
+    def __init__(self, doors, phase):
+        self._rooms = build_door_room_index(doors, phase)
+
+    @classmethod
+    def get(cls, doc, phase):
+        return cls._instances.get(doc, phase.Id.IntegerValue, lambda: cls(
+            FEC(doc).OfCategory(DB.BuiltInCategory.OST_Doors).WhereElementIsNotElementType(),
+            phase))
+
+    @classmethod
+    def invalidate(cls, doc=None):
+        '''drops the indexes of one document, or of all documents'''
+        cls._instances.invalidate(doc)
+
+    def doors_of(self, room):
+        return self._rooms.get(room.Id.IntegerValue, {'from': [], 'to': []})
+
+    def door_ids_of(self, room):
+        '''set of IntegerValue ids of all doors of the room'''
+        doors = self.doors_of(room)
+        return set(door.Id.IntegerValue for door in doors['from'] + doors['to'])
+
 
 class RoomAntiRutinaField(object):
     """
@@ -416,21 +532,8 @@ class RoomAntiRutinaField(object):
             for boundary_segments in self._get_room_boundary_segments()
         ]
 
-    def  _get_doors(self):
-        doors = {
-            'from': [],
-            'to': []
-        }
-        room, phase = self._room, self.phase
-        for door in FEC(self.doc).OfCategory(DB.BuiltInCategory.OST_Doors).WhereElementIsNotElementType():
-            if door.get_BoundingBox(None) is None:
-                continue
-            from_room, to_room = door.FromRoom[phase], door.ToRoom[phase]
-            if from_room and from_room.Id == room.Id:
-                doors['from'].append(door)
-            if to_room and to_room.Id == room.Id:
-                doors['to'].append(door)
-        return doors
+    def _get_doors(self):
+        return DoorRoomIndex.get(self.doc, self.phase).doors_of(self._room)
 
     @property
     def from_room_doors(self):
@@ -442,10 +545,8 @@ class RoomAntiRutinaField(object):
 
     @property
     def doors(self):
-        doors = []
-        for key in 'from', 'to':
-            doors.extend(self._get_doors()[key])
-        return doors
+        doors = self._get_doors()
+        return doors['from'] + doors['to']
 
     @property
     def door_ids(self):
@@ -495,8 +596,9 @@ class RoomAntiRutinaField(object):
             DB.XYZ.BasisZ,
             1
         )
+        door_ids = DoorRoomIndex.get(self.doc, self.phase).door_ids_of(self._room)
         for door in doors_to_include:
-            if door.Id in self.door_ids:
+            if door.Id.IntegerValue in door_ids:
                 DB.BooleanOperationsUtils.ExecuteBooleanOperationModifyingOriginalSolid(
                     solid,
                     DB.GeometryCreationUtilities.CreateExtrusionGeometry(
@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+
+'''
+Whole-model NUF classification for the NUF_Batch pushbutton.
+
+Revit access sits behind RoomAdapter and the prediction server behind a
+client with predict_many(names) (Snippets._nuf_client.NufClient), so the flow itself has no Revit or clr
+imports and can run on Linux with fake documents and rooms.
+'''
+
+
+class RoomAdapter(object):
+    '''Revit-facing operations of the batch mode'''
+
+    def collect_rooms(self):
+        '''Rooms to classify: the current selection or all placed rooms'''
+        raise NotImplementedError
+
+    def room_name(self, room):
+        raise NotImplementedError
+
+    def apply(self, assignments):
+        '''
+        Writes all (room, value) pairs in a single transaction,
+        returns the number of rooms that were updated
+        '''
+        raise NotImplementedError
+
+
+class NamePrediction(object):
+    '''Prediction for one distinct room name and all rooms carrying it'''
+
+    def __init__(self, name, rooms, result):
+        self.name = name
+        self.rooms = rooms
+        self.result = result or {}
+
+    @property
+    def predicted_class(self):
+        return self.result.get('predicted_class')
+
+    @property
+    def answered(self):
+        '''False if neither the server nor the catalogue had an answer'''
+        return bool(self.predicted_class)
+
+    @property
+    def confidence(self):
+        return self.result.get('confidence_percentage', 0.0)
+
+    @property
+    def path(self):
+        return self.result.get('path', 'model')
+
+    @property
+    def label(self):
+        '''One line of the review table'''
+        if not self.answered:
+            return u'{}  \u2192  no answer ({} room(s))'.format(self.name, len(self.rooms))
+        return u'{}  \u2192  {}  ({:.1f}%, {}, {} room(s))'.format(
+            self.name, self.predicted_class, self.confidence, self.path, len(self.rooms))
+
+    def __repr__(self):
+        return '{} -> {} ({}%, {} rooms)'.format(
+            self.name, self.predicted_class, self.confidence, len(self.rooms))
+
+
+def group_rooms_by_name(adapter, rooms):
+    '''{name: [rooms]} in order of first appearance, unnamed rooms are skipped'''
+    groups = {}
+    for room in rooms:
+        name = (adapter.room_name(room) or '').strip()
+        if name:
+            groups.setdefault(name, []).append(room)
+    return groups
+
+
+def classify_rooms(adapter, client):
+    '''
+    Collects the rooms, sends every distinct name once and returns a
+    NamePrediction per name: answered names by ascending confidence, so
+    doubtful names come first in the review table, then the names nobody
+    could answer (see NamePrediction.answered)
+    '''
+    groups = group_rooms_by_name(adapter, adapter.collect_rooms())
+    # the model was trained on lower case names
+    results = client.predict_many([name.lower() for name in groups])
+    predictions = [
+        NamePrediction(name, rooms, results.get(name.lower()))
+        for name, rooms in groups.items()
+    ]
+    return sorted(
+        [prediction for prediction in predictions if prediction.answered],
+        key=lambda prediction: prediction.confidence
+    ) + [prediction for prediction in predictions if not prediction.answered]
+
+
+def apply_predictions(adapter, predictions):
+    '''Writes the accepted, answered predictions to all of their rooms in one go'''
+    assignments = [
+        (room, prediction.predicted_class)
+        for prediction in predictions if prediction.answered
+        for room in prediction.rooms
+    ]
+    if not assignments:
+        return 0
+    return adapter.apply(assignments)
+
@@ -0,0 +1,273 @@
+# -*- coding: utf-8 -*-
+
+'''
+Client of the NUF prediction server (app.py) for the pyRevit buttons.
+
+One keep-alive session with a connection pool, connect/read timeouts,
+retries with backoff, automatic chunking of long name lists into
+/predict_batch requests and a small local result cache. If the server can
+not be reached, names are looked up in a local copy of the NC catalogue
+instead, and the server is not asked again for a while, so Revit never
+waits on a stalled server.
+
+Single names and feedback use a short read timeout and read timeouts are
+never retried: a server that accepts connections but does not answer
+costs one read timeout, not one per retry.
+'''
+
+import csv
+import difflib
+import os
+import re
+import time
+from collections import OrderedDict
+
+DEFAULT_URL = 'http://127.0.0.1:5002'
+
+_LIB_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Where the offline catalogue is looked for, first match wins: the file set in
+# NUF_CATALOGUE_PATH, a copy in the extension's lib folder, and data/ of the
+# repository checkout the extension is part of
+CATALOGUE_PATHS = [
+    os.path.join(_LIB_PATH, 'NUF_data.csv'),
+    os.path.normpath(os.path.join(_LIB_PATH, '..', '..', 'data', 'NUF_data.csv')),
+]
+
+
+def find_catalogue():
+    '''Path of the offline NC catalogue, None if there is none'''
+    paths = list(CATALOGUE_PATHS)
+    if os.environ.get('NUF_CATALOGUE_PATH'):
+        paths.insert(0, os.environ['NUF_CATALOGUE_PATH'])
+    for path in paths:
+        if os.path.exists(path):
+            return path
+    return None
+
+
+def to_model_text(text):
+    '''Lower case and collapsed whitespace, the text the model sees on the server'''
+    return re.sub(r'\s+', ' ', text.strip().lower())
+
+
+def normalize_name(text):
+    '''Catalogue lookup key: to_model_text with folded umlauts, as on the server'''
+    text = to_model_text(text)
+    return re.sub(r'ü', 'u', re.sub(r'ö', 'o', re.sub(r'ä', 'a', re.sub(r'ß', 'ss', text))))
+
+
+class CatalogueFallback(object):
+    '''
+    Offline answers from the NC catalogue: exact match of the normalized
+    Bezeichnung, otherwise the closest one by difflib ratio
+    '''
+
+    def __init__(self, path=None, cutoff=0.85):
+        self.cutoff = cutoff
+        path = path or find_catalogue()
+        entries_by_key = {}
+        if path is None or not os.path.exists(path):
+            print("NC catalogue not found ({}), names can not be classified while the "
+                  "prediction server is down. Copy data/NUF_data.csv to {} or set "
+                  "NUF_CATALOGUE_PATH.".format(path or ', '.join(CATALOGUE_PATHS), _LIB_PATH))
+        else:
+            with open(path, 'r', encoding='utf-8') as f:
+                for entry in csv.DictReader(f):
+                    for column in ('Bezeichnung', 'bezeichnung_no_special_ch'):
+                        if entry.get(column):
+                            entries_by_key.setdefault(normalize_name(entry[column]), []).append(entry)
+        # names listed under several NUF classes can not be answered offline
+        self._entries = {
+            key: entries[0] for key, entries in entries_by_key.items()
+            if len(set(entry['NUF'] for entry in entries)) == 1
+        }
+        self._keys = list(self._entries)
+
+    def lookup(self, name):
+        key = normalize_name(name)
+        if key in self._entries:
+            return self._result(name, self._entries[key], 1.0, 'offline-exact')
+        matches = difflib.get_close_matches(key, self._keys, n=1, cutoff=self.cutoff)
+        if matches:
+            ratio = difflib.SequenceMatcher(None, key, matches[0]).ratio()
+            return self._result(name, self._entries[matches[0]], ratio, 'offline-fuzzy')
+        return None
+
+    def _result(self, name, entry, similarity, path):
+        return {
+            'input_text': name,
+            'predicted_class': entry['NUF'],
+            'predicted_nc': entry['NC'],
+            'confidence_percentage': round(similarity * 100, 2),
+            'all_class_scores': {entry['NUF']: similarity},
+            'matched_entry': {'NC': entry['NC'], 'Bezeichnung': entry['Bezeichnung']},
+            'path': path
+        }
+
+
+class NufClient(object):
+    '''
+    read_timeout applies to /predict and /feedback; a /predict_batch chunk
+    may take read_timeout plus batch_timeout_per_name for every name in it.
+    '''
+
+    def __init__(self, base_url=DEFAULT_URL, connect_timeout=2.0, read_timeout=5.0,
+                 batch_timeout_per_name=0.05, retries=2, backoff_factor=0.3, chunk_size=500,
+                 cache_size=2000, pool_size=4, down_for=30.0, fallback=None):
+        self.base_url = base_url.rstrip('/')
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.batch_timeout_per_name = batch_timeout_per_name
+        self.chunk_size = chunk_size
+        self.cache_size = cache_size
+        self.down_for = down_for
+        self.fallback = fallback if fallback is not None else CatalogueFallback()
+        self.session = self._create_session(retries, backoff_factor, pool_size)
+        self._cache = OrderedDict()
+        self._down_until = 0.0
+
+    @staticmethod
+    def _create_session(retries, backoff_factor, pool_size):
+        import requests
+        from requests.adapters import HTTPAdapter
+        from urllib3.util.retry import Retry
+
+        # a read timeout already cost the full timeout, retrying it would multiply the wait.
+        # 503 means the server is still loading: it is not retried (its Retry-After
+        # would block Revit for seconds), _post marks the server down instead.
+        retry_options = dict(total=retries, connect=retries, read=0,
+                             backoff_factor=backoff_factor, status_forcelist=(502, 504),
+                             respect_retry_after_header=False)
+        try:
+            retry = Retry(allowed_methods=frozenset(['GET', 'POST']), **retry_options)
+        except TypeError:  # urllib3 < 1.26
+            retry = Retry(method_whitelist=frozenset(['GET', 'POST']), **retry_options)
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size, max_retries=retry)
+        session = requests.Session()
+        session.mount('http://', adapter)
+        session.mount('https://', adapter)
+        return session
+
+    @property
+    def server_available(self):
+        return time.time() >= self._down_until
+
+    def _cache_get(self, key):
+        result = self._cache.get(key)
+        if result is not None:
+            self._cache.move_to_end(key)
+        return result
+
+    def _cache_put(self, key, result):
+        if self.cache_size <= 0:
+            return
+        self._cache[key] = result
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    def _post(self, endpoint, payload, read_timeout=None):
+        import requests
+        timeout = (self.connect_timeout, read_timeout or self.read_timeout)
+        try:
+            response = self.session.post(self.base_url + endpoint, json=payload, timeout=timeout)
+        except (requests.ConnectionError, requests.Timeout, requests.exceptions.RetryError):
+            self._down_until = time.time() + self.down_for
+            raise
+        if response.status_code == 503:
+            self._down_until = time.time() + self._retry_after(response)
+        response.raise_for_status()
+        return response.json()
+
+    def _retry_after(self, response):
+        '''seconds from the Retry-After header of a 503, down_for without one'''
+        try:
+            return float(response.headers.get('Retry-After'))
+        except (TypeError, ValueError):
+            return self.down_for
+
+    def predict(self, name, **options):
+        '''
+        Result of one name from /predict, where the server can batch it
+        together with other users' requests. None if nobody could answer.
+        '''
+        import requests
+        key = to_model_text(name)
+        cached = self._cache_get(key) if not options else None
+        if cached is not None:
+            return cached
+        if self.server_available:
+            try:
+                result = self._post('/predict', dict(options, text=name))
+                if not options:
+                    self._cache_put(key, result)
+                return result
+            except requests.RequestException as e:
+                print("Prediction server not available, using the catalogue: {}".format(e))
+        return self.fallback.lookup(name) if self.fallback else None
+
+    def predict_many(self, names, **options):
+        '''
+        {name: result} for a list of names. Cached names are not sent again,
+        the rest goes to /predict_batch in chunks of chunk_size. Extra options
+        (e.g. mode="knn") are passed on to the server. Names the server could
+        not answer are looked up in the catalogue; names without any answer
+        are missing from the result.
+        '''
+        import requests
+        results = {}
+        pending = OrderedDict()
+        for name in names:
+            key = to_model_text(name)
+            cached = self._cache_get(key) if not options else None
+            if cached is not None:
+                results[name] = cached
+            elif key:
+                pending.setdefault(key, []).append(name)
+
+        keys = list(pending)
+        for start in range(0, len(keys), self.chunk_size):
+            if not self.server_available:
+                break
+            chunk = keys[start:start + self.chunk_size]
+            texts = [pending[key][0] for key in chunk]
+            payload = dict(options, texts=texts)
+            try:
+                chunk_results = self._post(
+                    '/predict_batch', payload,
+                    self.read_timeout + self.batch_timeout_per_name * len(texts))['results']
+            except requests.RequestException as e:
+                print("Prediction server not available, using the catalogue: {}".format(e))
+                break
+            for key, result in zip(chunk, chunk_results):
+                if not options:
+                    self._cache_put(key, result)
+                for name in pending.pop(key):
+                    results[name] = result
+
+        # whatever is left could not be answered by the server
+        for key, pending_names in pending.items():
+            result = self.fallback.lookup(pending_names[0]) if self.fallback else None
+            if result is not None:
+                for name in pending_names:
+                    results[name] = result
+        return results
+
+    def feedback(self, name, nuf, weight=None):
+        '''
+        Reports a classification the user confirmed, so the server can move
+        the class prototype towards it. Returns the server answer, or None
+        if the server is not reachable - feedback is never required.
+        '''
+        import requests
+        if not self.server_available:
+            return None
+        payload = {'text': name, 'nuf': nuf}
+        if weight is not None:
+            payload['weight'] = weight
+        try:
+            return self._post('/feedback', payload)
+        except requests.RequestException as e:
+            print("Feedback not sent: {}".format(e))
+            return None
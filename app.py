@@ -1,71 +1,748 @@
-from flask import Flask, request, jsonify
-from sentence_transformers import SentenceTransformer
-import torch
-import numpy as np
-import json
-from sklearn.metrics.pairwise import cosine_similarity
+from flask import Flask, Response, g, request, jsonify, stream_with_context
+import logging
+import os
+import time
+
+from nuf_classifier.backends import load_model
+from nuf_classifier.batcher import MicroBatcher
+from nuf_classifier.cache import LRUCache
+from nuf_classifier.catalogue import CATALOGUE_PATH, load_catalogue
+from nuf_classifier.encoder import CachedEncoder
+from nuf_classifier.feedback import FeedbackStore, PrototypeUpdater
+from nuf_classifier.fingerprint import path_fingerprint, weights_fingerprint
+from nuf_classifier.knn import CatalogueIndex
+from nuf_classifier.lexical import LexicalIndex
+from nuf_classifier.metrics import REGISTRY, SIZE_BUCKETS, STAGE_SECONDS, instrument_tokenizer
+from nuf_classifier.precision import check_precision
+from nuf_classifier.profiler import SamplingProfiler
+from nuf_classifier.projection import Projection
+from nuf_classifier.prototypes import PrototypeMatrix
+from nuf_classifier.registry import ModelRegistry, smoke_set
+from nuf_classifier.startup import Startup, warmup_names
+from nuf_classifier.store import EmbeddingStore
 
 app = Flask(__name__)
+# Keep responses compact and in insertion order, sorting keys costs time per request
+app.json.sort_keys = False
+
+logger = logging.getLogger("nuf_classifier")
+
+MODEL_PATH = os.environ.get("NUF_MODEL_PATH", './fine_tuned_model_for_NUF_clustering_v5')
+
+# Name of the first model version, reported as "model_version" in responses;
+# more versions can be loaded at runtime, see nuf_classifier/registry.py
+MODEL_VERSION = os.environ.get("NUF_MODEL_VERSION") or os.path.basename(os.path.normpath(MODEL_PATH))
+
+# A new version is only registered if it classifies at least this share of
+# NUF_SMOKE_SIZE catalogue names as their catalogue NUF
+SMOKE_SIZE = int(os.environ.get("NUF_SMOKE_SIZE", 200))
+SMOKE_MIN_ACCURACY = float(os.environ.get("NUF_SMOKE_MIN_ACCURACY", 0.8))
+
+# Allows loading, activating and unloading model versions through /models.
+# The versions live in the process that loaded them, so this needs a single
+# server process (python serve.py, or gunicorn with NUF_WORKERS=1).
+MODEL_ADMIN_ENABLED = os.environ.get("NUF_MODEL_ADMIN", "0") == "1"
+
+# Encoder backend: "torch" (fp32), "onnx" (ONNX Runtime) or "int8" (dynamically
+# quantized), see nuf_classifier/backends.py and benchmarks/check_backend.py
+BACKEND = os.environ.get("NUF_BACKEND", "torch")
+ONNX_FILE_NAME = os.environ.get("NUF_ONNX_FILE") or None
+
+# Binary prototypes exported with "python -m nuf_classifier.prototypes",
+# class_embeddings.json is used when the .npy file does not exist
+PROTOTYPES_PATH = os.environ.get("NUF_PROTOTYPES", "class_embeddings.npy")
+
+# Number of names passed through the transformer at once when NUF_TOKEN_BUDGET
+# is 0; a "batch_size" in a request caps the names per batch in both cases
+BATCH_SIZE = int(os.environ.get("NUF_BATCH_SIZE", 64))
+
+# Names are sorted by token length and batched by this many padded tokens,
+# so short names are not padded to long ones (0 = fixed NUF_BATCH_SIZE batches)
+TOKEN_BUDGET = int(os.environ.get("NUF_TOKEN_BUDGET", 4096))
+
+# Optional PCA projection fitted with "python -m nuf_classifier.projection"
+# (e.g. to 128 dimensions). It only applies to the model version loaded at
+# startup; versions loaded by POST /models bring their own "projection_path".
+PROJECTION_PATH = os.environ.get("NUF_PROJECTION", "")
+
+# Precision of the prototypes, the cached embeddings, the embedding store and
+# the k-NN index: float32, float16 or int8. benchmarks/bench_projection.py
+# reports the accuracy of each projection and precision.
+PRECISION = check_precision(os.environ.get("NUF_PRECISION", "float32"))
+
+# Number of room name embeddings kept in memory, 0 disables the cache
+CACHE_SIZE = int(os.environ.get("NUF_CACHE_SIZE", 10000))
+
+# Optional SQLite file that keeps embeddings of seen names across restarts
+EMBEDDING_STORE_PATH = os.environ.get("NUF_EMBEDDING_STORE", "")
+
+# Concurrent single-name requests are encoded together: a batch is sent to
+# the model after NUF_MICROBATCH_MAX_SIZE names or NUF_MICROBATCH_MAX_WAIT_MS
+MICROBATCH_ENABLED = os.environ.get("NUF_MICROBATCH", "1") == "1"
+MICROBATCH_MAX_SIZE = int(os.environ.get("NUF_MICROBATCH_MAX_SIZE", 32))
+MICROBATCH_MAX_WAIT_MS = float(os.environ.get("NUF_MICROBATCH_MAX_WAIT_MS", 5))
+
+# Nearest-neighbour search over all catalogue entries for "mode": "knn",
+# "exact" (matrix search), "approximate" (HNSW, needs hnswlib) or "none"
+KNN_INDEX_TYPE = os.environ.get("NUF_KNN_INDEX", "exact")
+KNN_K = int(os.environ.get("NUF_KNN_K", 5))
+
+MODES = ("prototype", "knn")
+
+# Names encoded and written per NDJSON chunk by /predict_stream
+STREAM_CHUNK_SIZE = int(os.environ.get("NUF_STREAM_CHUNK_SIZE", 256))
+
+# Intra-op threads of torch per process; with several server workers keep
+# workers * threads at or below the number of CPU cores (0 = torch default)
+TORCH_THREADS = int(os.environ.get("NUF_TORCH_THREADS", 0))
+
+# Exact / near-exact catalogue matches are answered without the transformer;
+# a fuzzy match needs at least this edit-distance similarity (1 disables it)
+LEXICAL_ENABLED = os.environ.get("NUF_LEXICAL", "1") == "1"
+LEXICAL_MIN_SIMILARITY = float(os.environ.get("NUF_LEXICAL_MIN_SIMILARITY", 0.9))
+
+# SQLite file of names confirmed in the pyRevit buttons (POST /feedback), e.g.
+# nuf_feedback.db; each confirmation moves its class prototype. Any client can
+# send feedback, so it is off unless a file is set. Every worker picks up the
+# confirmations of the others after at most NUF_FEEDBACK_SYNC_SECONDS.
+FEEDBACK_PATH = os.environ.get("NUF_FEEDBACK_DB", "")
+FEEDBACK_SYNC_SECONDS = float(os.environ.get("NUF_FEEDBACK_SYNC_SECONDS", 5))
+
+# Load the model in a background thread while the server already accepts
+# connections (0 = load before serving), then warm it up with this many
+# catalogue names (0 = no warm-up)
+BACKGROUND_LOAD = os.environ.get("NUF_BACKGROUND_LOAD", "1") == "1"
+WARMUP_SIZE = int(os.environ.get("NUF_WARMUP_SIZE", 64))
+
+# Exposes POST/GET /debug/profiler to switch a sampling profiler on at runtime
+PROFILER_ENABLED = os.environ.get("NUF_PROFILER", "0") == "1"
+# Shortest sampling interval accepted by POST /debug/profiler
+PROFILER_MIN_INTERVAL_MS = 1
+
+REQUESTS = REGISTRY.counter(
+    "nuf_requests_total", "HTTP requests by endpoint and status", ("endpoint", "status"))
+REQUEST_SECONDS = REGISTRY.histogram(
+    "nuf_request_seconds", "Request latency by endpoint", ("endpoint",))
+REQUEST_NAMES = REGISTRY.histogram(
+    "nuf_request_names", "Room names per request", ("endpoint",), buckets=SIZE_BUCKETS)
+ANSWERS = REGISTRY.counter(
+    "nuf_answers_total", "Classified names by the path that answered them", ("path",))
+
+def _active_stat(read, default=0):
+    """Metric value of the active model version, default while none is loaded"""
+    try:
+        return read(registry.get())
+    except KeyError:
+        return default
+
+
+for stat_name, metric_type in (("hits", "counter"), ("misses", "counter"),
+                               ("evictions", "counter"), ("size", "gauge")):
+    REGISTRY.callback(
+        f"nuf_cache_{stat_name}" + ("_total" if metric_type == "counter" else ""),
+        f"Embedding cache {stat_name} of the active model",
+        lambda stat_name=stat_name: _active_stat(
+            lambda version: version.encoder.cache.stats()[stat_name]),
+        metric_type
+    )
+REGISTRY.callback("nuf_cache_hit_rate", "Embedding cache hit rate of the active model",
+                  lambda: _active_stat(lambda version: version.encoder.cache.stats()["hit_rate"]))
+if MICROBATCH_ENABLED:
+    REGISTRY.callback("nuf_microbatch_batches_total", "Batches run by the micro-batcher",
+                      lambda: _active_stat(lambda version: version.encoder.batcher.batches), "counter")
+    REGISTRY.callback("nuf_microbatch_items_total", "Names encoded by the micro-batcher",
+                      lambda: _active_stat(lambda version: version.encoder.batcher.items), "counter")
+REGISTRY.callback("nuf_ready", "1 once the model is loaded and warmed up",
+                  lambda: int(startup.ready))
+
+profiler = SamplingProfiler()
+
+# Set by load_service(), they do not depend on the model
+catalogue = None
+lexical_index = None
+feedback_store = None
+catalogue_counts = {}
+
+
+def build_version(startup, version):
+    """
+    Loads the model and prototypes of one version and everything built on
+    them, then sends a warm-up batch of catalogue names through the model.
+    """
+    with startup.step("model"):
+        model = instrument_tokenizer(load_model(version.model_path, BACKEND,
+                                                onnx_file_name=ONNX_FILE_NAME))
+
+    # Loaded once: one L2-normalized row per class plus a parallel label array
+    with startup.step("prototypes"):
+        prototypes = PrototypeMatrix.load(version.prototypes_path)
+        projection = None
+        if version.projection_path:
+            projection = Projection.load(version.projection_path)
+            if projection.input_dimension != prototypes.dimension:
+                raise ValueError(f"{version.projection_path} projects {projection.input_dimension} "
+                                 f"dimensions, the prototypes have {prototypes.dimension}")
+            prototypes = prototypes.projected(projection)
+        version.prototypes = prototypes.compressed(PRECISION)
+
+    # Vectors of other projections or precisions must never be mixed in
+    vector_tag = BACKEND + (f"-{projection.fingerprint()}" if projection is not None else "")
+    if PRECISION != "float32":
+        vector_tag += f"-{PRECISION}"
+
+    # Embeddings of already seen names, keyed by the text the model sees. Every
+    # version has its own cache, tagged with the fingerprint of its files.
+    embedding_cache = LRUCache(CACHE_SIZE)
+    embedding_cache.ensure_version(
+        f"{path_fingerprint(version.model_path, version.prototypes_path)}-{vector_tag}")
+    encoder = CachedEncoder(model, embedding_cache, batch_size=BATCH_SIZE, token_budget=TOKEN_BUDGET,
+                            projection=projection, precision=PRECISION)
+
+    # Persistent store tagged with the model weights fingerprint, warm-loaded
+    # into the in-memory cache so known names are fast from the first request
+    if EMBEDDING_STORE_PATH:
+        with startup.step("embedding_store"):
+            # each backend produces slightly different vectors, so it is part of the tag
+            encoder.store = EmbeddingStore(
+                EMBEDDING_STORE_PATH, f"{weights_fingerprint(version.model_path)}-{vector_tag}",
+                precision=PRECISION)
+            encoder.store.warm_load(embedding_cache, packed=PRECISION != "float32")
+
+    if MICROBATCH_ENABLED:
+        encoder.batcher = MicroBatcher(
+            encoder.encode_uncached,
+            max_batch_size=MICROBATCH_MAX_SIZE,
+            max_wait_ms=MICROBATCH_MAX_WAIT_MS
+        )
+    version.encoder = encoder
+
+    # Confirmed names update the prototypes as a running mean; a class starts
+    # with the weight of its catalogue entries. The stored confirmations are
+    # replayed on top of the prototype file, see nuf_classifier/feedback.py.
+    if feedback_store is not None:
+        with startup.step("feedback"):
+            version.prototype_updater = PrototypeUpdater(
+                version.name, version.prototypes, feedback_store, encoder.encode,
+                prior_counts=catalogue_counts)
+            version.prototypes = version.prototype_updater.prototypes
+
+    # Every catalogue row embedded once, see nuf_classifier/knn.py
+    if KNN_INDEX_TYPE != "none":
+        with startup.step("knn_index"):
+            version.catalogue_index = CatalogueIndex.build(catalogue, encoder, KNN_INDEX_TYPE,
+                                                           precision=PRECISION)
+
+    # Bypasses the caches: one single name (the /predict shape) and one batch
+    if WARMUP_SIZE > 0:
+        with startup.step("warmup"):
+            names = warmup_names(catalogue, WARMUP_SIZE)
+            for batch in (names[:1], names):
+                version.prototypes.classify(batch, encoder.encode_uncached(batch))
+
+
+registry = ModelRegistry(build_version, min_accuracy=SMOKE_MIN_ACCURACY)
+
+
+def load_service(startup):
+    """
+    Loads the catalogue and the first model version, timing each step.
+    Later versions are loaded through POST /models.
+    """
+    global catalogue, lexical_index, feedback_store, catalogue_counts
+
+    if BACKEND != "stub":
+        with startup.step("imports"):
+            import torch
+            import sentence_transformers  # noqa: F401, imported here to time it separately
+            if TORCH_THREADS > 0:
+                torch.set_num_threads(TORCH_THREADS)
+
+    with startup.step("catalogue"):
+        catalogue = load_catalogue(CATALOGUE_PATH)
+        if LEXICAL_ENABLED:
+            lexical_index = LexicalIndex(catalogue, min_similarity=LEXICAL_MIN_SIMILARITY)
+        for entry in catalogue:
+            catalogue_counts[entry['NUF']] = catalogue_counts.get(entry['NUF'], 0) + 1
+        if SMOKE_SIZE > 0:
+            registry.smoke_texts, registry.smoke_labels = smoke_set(catalogue, SMOKE_SIZE)
+    if FEEDBACK_PATH:
+        feedback_store = FeedbackStore(FEEDBACK_PATH)
+
+    registry.load(MODEL_VERSION, MODEL_PATH, PROTOTYPES_PATH, startup=startup,
+                  projection_path=PROJECTION_PATH)
+
+
+# Flask accepts connections right away, the model is loaded in the background.
+# With gunicorn's preload_app the master loads it before forking the workers.
+startup = Startup()
+startup.run(load_service, background=BACKGROUND_LOAD)
+
+
+def get_version(name=None):
+    """
+    The model version a request pinned with "model_version", or the active
+    one, taken once per request; returns (version, error message).
+    """
+    try:
+        version = registry.get(name)
+    except KeyError:
+        return None, f"Model version {name!r} is not loaded, see GET /models."
+    g.model_version = version.name
+    if version.prototype_updater is not None:
+        # confirmations other workers received since the last check
+        version.prototypes = version.prototype_updater.sync(FEEDBACK_SYNC_SECONDS)
+    return version, None
+
+
+def parse_mode(data, version):
+    """
+    Reads the optional "mode" and "k" fields of a request,
+    returns (mode, k, error message).
+    """
+    mode = data.get("mode", "prototype")
+    if mode not in MODES:
+        return None, None, f"'mode' must be one of {', '.join(MODES)}."
+    if mode == "knn" and version.catalogue_index is None:
+        return None, None, "k-NN mode is disabled on this server."
+    k, error = parse_positive_int(data, "k")
+    if error:
+        return None, None, error
+    return mode, k or KNN_K, None
+
+
+def parse_positive_int(data, field, default=None):
+    """Reads an optional positive integer field, returns (value, error message)"""
+    value = data.get(field, default)
+    if value is None:
+        return None, None
+    if not isinstance(value, int) or isinstance(value, bool) or value < 1:
+        return None, f"'{field}' must be a positive integer."
+    return value, None
+
+
+def parse_positive_number(data, field, default=None):
+    """Reads an optional positive int or float field, returns (value, error message)"""
+    value = data.get(field, default)
+    if value is None:
+        return None, None
+    if not isinstance(value, (int, float)) or isinstance(value, bool) or not 0 < value < float("inf"):
+        return None, f"'{field}' must be a positive number."
+    return value, None
+
+
+def parse_texts(data):
+    """Reads the "texts" list of a batch request, returns (texts, error message)"""
+    if not isinstance(data, dict) or not isinstance(data.get("texts"), list):
+        return None, "Invalid input. JSON with 'texts' list required."
+    input_texts = data["texts"]
+    for index, input_text in enumerate(input_texts):
+        if not isinstance(input_text, str) or not input_text.strip():
+            return None, f"Text at index {index} must be a non-empty string."
+    return input_texts, None
+
+
+def classify(version, input_texts, embeddings, mode="prototype", k=KNN_K, top_k=None):
+    """One result per input text, by class prototypes or catalogue neighbours"""
+    if mode == "knn":
+        return version.catalogue_index.classify(input_texts, embeddings, k=k)
+    return version.prototypes.classify(input_texts, embeddings, top_k)
+
+
+def predict_texts(version, input_texts, mode="prototype", k=KNN_K, batch_size=None, lexical=True,
+                  top_k=None):
+    """
+    Results for a list of names in input order. Names with a confident
+    lexical catalogue match are answered directly, only the rest is encoded.
+    Every result says which "path" answered it: exact, fuzzy or model.
+    k-NN mode always asks the index, a lexical result has no neighbours.
+    """
+    results = [None] * len(input_texts)
+    pending = []
+    lexical = lexical and mode != "knn"
+    with STAGE_SECONDS.time(stage="lexical"):
+        for index, input_text in enumerate(input_texts):
+            match = lexical_index.lookup(input_text) if lexical and lexical_index else None
+            if match:
+                results[index] = lexical_index.build_result(input_text, match)
+                ANSWERS.inc(path=match["path"])
+            else:
+                pending.append(index)
 
-MODEL_PATH = './fine_tuned_model_for_NUF_clustering_v5'
+    if pending:
+        texts = [input_texts[index] for index in pending]
+        # Cached names are skipped, the rest goes through one batched encode call
+        embeddings = version.encoder.encode(texts, batch_size=batch_size)
+        with STAGE_SECONDS.time(stage="score"):
+            model_results = classify(version, texts, embeddings, mode, k, top_k)
+        for index, result in zip(pending, model_results):
+            result["path"] = "model"
+            results[index] = result
+        ANSWERS.inc(len(pending), path="model")
+    return results
 
-device = 'cuda' if torch.cuda.is_available() else 'cpu'
-model = SentenceTransformer(MODEL_PATH, device=device)
 
-with open("class_embeddings.json", "r") as f:
-    class_embeddings = json.load(f)
+def json_response(payload, status=200):
+    """Serializes a response body, timed as stage serialize"""
+    with STAGE_SECONDS.time(stage="serialize"):
+        body = app.json.dumps(payload)
+    return Response(body, status=status, mimetype="application/json")
+
+
+# Answered while the model is still loading
+ALWAYS_AVAILABLE = {"healthz", "readyz", "metrics", "debug_profiler"}
+
+
+@app.before_request
+def start_timer():
+    g.request_start = time.perf_counter()
+    if not startup.ready and request.endpoint not in ALWAYS_AVAILABLE:
+        error = "Model failed to load." if startup.error else "Model is loading, try again shortly."
+        response = jsonify({"error": error})
+        response.status_code = 503
+        response.headers["Retry-After"] = "5"
+        return response
+
+
+@app.after_request
+def record_request(response):
+    endpoint = request.endpoint or "unknown"
+    REQUESTS.inc(endpoint=endpoint, status=response.status_code)
+    if hasattr(g, "request_start"):
+        REQUEST_SECONDS.observe(time.perf_counter() - g.request_start, endpoint=endpoint)
+    model_version = g.get("model_version", registry.active_name)
+    if model_version is not None:
+        response.headers["X-Model-Version"] = model_version
+    return response
 
-for class_label, embedding_list in class_embeddings.items():
-    class_embeddings[class_label] = np.array(embedding_list)
 
 @app.route("/predict", methods=["POST"])
 def predict():
     """
     Expects JSON input like:
     {
-      "text": "room name to classify"
+      "text": "room name to classify",
+      "mode": "prototype" or "knn"  (optional),
+      "k": 5  (optional, neighbours for "knn"),
+      "lexical": true  (optional, false skips the catalogue lookup, "knn" never uses it),
+      "top_k": 3  (optional, only the 3 best classes in "all_class_scores"),
+      "model_version": "..."  (optional, a loaded version instead of the active one)
     }
+    The result names the model version that answered it in "model_version".
     """
-    data = request.get_json()  # parse JSON
-    if not data or "text" not in data:
+    with STAGE_SECONDS.time(stage="parse"):
+        data = request.get_json()  # parse JSON
+    if not isinstance(data, dict) or "text" not in data:
         return jsonify({"error": "Invalid input. JSON with 'text' required."}), 400
 
     input_text = data["text"]
+    if not isinstance(input_text, str):
+        return jsonify({"error": "'text' must be a string."}), 400
     if not input_text.strip():
         return jsonify({"error": "Text cannot be empty."}), 400
 
-    new_embedding = model.encode(input_text, convert_to_numpy=True, normalize_embeddings=True)
+    version, error = get_version(data.get("model_version"))
+    if error:
+        return jsonify({"error": error}), 400
 
-    class_scores = {}
-    for label, prototype in class_embeddings.items():
-        similarity = cosine_similarity(
-            new_embedding.reshape(1, -1),
-            prototype.reshape(1, -1)
-        )[0][0]
-        class_scores[label] = float(similarity)  # convert numpy float to Python float
+    mode, k, error = parse_mode(data, version)
+    if error:
+        return jsonify({"error": error}), 400
 
-    sum_of_scores = sum(class_scores.values())
-    best_class = max(class_scores, key=class_scores.get)  # label with highest similarity
-    best_score = class_scores[best_class]
+    top_k, error = parse_positive_int(data, "top_k")
+    if error:
+        return jsonify({"error": error}), 400
 
-    if sum_of_scores > 0:
-        confidence = (best_score / sum_of_scores) * 100
-    else:
-        confidence = 0.0
+    REQUEST_NAMES.observe(1, endpoint="predict")
+    response = predict_texts(version, [input_text], mode, k, lexical=data.get("lexical", True),
+                             top_k=top_k)[0]
+    response["model_version"] = version.name
+
+    logger.debug("Prediction: %s", response)
+
+    return json_response(response)
 
-    response = {
-        "input_text": input_text,
-        "predicted_class": best_class,
-        "confidence_percentage": round(confidence, 2),
-        "all_class_scores": class_scores
+
+@app.route("/predict_batch", methods=["POST"])
+def predict_batch():
+    """
+    Expects JSON input like:
+    {
+      "texts": ["room name 1", "room name 2", ...],
+      "batch_size": 64  (optional),
+      "mode": "prototype" or "knn"  (optional),
+      "k": 5  (optional),
+      "lexical": true  (optional),
+      "top_k": 3  (optional),
+      "model_version": "..."  (optional)
     }
+    Returns {"model_version": "...", "results": [...]} with one
+    /predict-style result per name, in the same order as "texts".
+    """
+    with STAGE_SECONDS.time(stage="parse"):
+        data = request.get_json()  # parse JSON
+    input_texts, error = parse_texts(data)
+    if error:
+        return jsonify({"error": error}), 400
+
+    batch_size, error = parse_positive_int(data, "batch_size")
+    if error:
+        return jsonify({"error": error}), 400
+
+    top_k, error = parse_positive_int(data, "top_k")
+    if error:
+        return jsonify({"error": error}), 400
+
+    version, error = get_version(data.get("model_version"))
+    if error:
+        return jsonify({"error": error}), 400
+
+    mode, k, error = parse_mode(data, version)
+    if error:
+        return jsonify({"error": error}), 400
+
+    if not input_texts:
+        return {"model_version": version.name, "results": []}, 200
+
+    REQUEST_NAMES.observe(len(input_texts), endpoint="predict_batch")
+    results = predict_texts(version, input_texts, mode, k, batch_size,
+                            lexical=data.get("lexical", True), top_k=top_k)
+    return json_response({"model_version": version.name, "results": results})
+
+
+@app.route("/predict_stream", methods=["POST"])
+def predict_stream():
+    """
+    Same input as /predict_batch plus an optional "chunk_size" (names per
+    chunk). The names are encoded chunk by chunk and every result is written
+    as one JSON line ("application/x-ndjson") with its "index" in "texts"
+    as soon as its chunk is done, so the response starts before the whole
+    list is classified and is never held in memory at once. The model
+    version is sent in the X-Model-Version header.
+    """
+    with STAGE_SECONDS.time(stage="parse"):
+        data = request.get_json()  # parse JSON
+    input_texts, error = parse_texts(data)
+    if error:
+        return jsonify({"error": error}), 400
+
+    batch_size, error = parse_positive_int(data, "batch_size")
+    if error:
+        return jsonify({"error": error}), 400
+
+    chunk_size, error = parse_positive_int(data, "chunk_size", STREAM_CHUNK_SIZE)
+    if error:
+        return jsonify({"error": error}), 400
+
+    top_k, error = parse_positive_int(data, "top_k")
+    if error:
+        return jsonify({"error": error}), 400
+
+    version, error = get_version(data.get("model_version"))
+    if error:
+        return jsonify({"error": error}), 400
+
+    mode, k, error = parse_mode(data, version)
+    if error:
+        return jsonify({"error": error}), 400
+
+    lexical = data.get("lexical", True)
+    REQUEST_NAMES.observe(len(input_texts), endpoint="predict_stream")
+
+    def generate():
+        for start in range(0, len(input_texts), chunk_size):
+            try:
+                results = predict_texts(version, input_texts[start:start + chunk_size], mode, k,
+                                        batch_size, lexical=lexical, top_k=top_k)
+            except Exception:
+                # the status line is already sent, so the error becomes the last line
+                logger.exception("Streaming prediction failed at index %d", start)
+                yield app.json.dumps({"index": start, "error": "Prediction failed."}) + "\n"
+                return
+            with STAGE_SECONDS.time(stage="serialize"):
+                chunk = "".join(
+                    app.json.dumps({"index": start + offset, **result}) + "\n"
+                    for offset, result in enumerate(results)
+                )
+            yield chunk
+
+    # no Content-Length, so the body is sent with chunked transfer encoding
+    return Response(stream_with_context(generate()), mimetype="application/x-ndjson")
+
+
+@app.route("/feedback", methods=["POST"])
+def feedback():
+    """
+    Records a classification confirmed by a user and moves the prototype
+    of its class towards the name. Expects JSON input like:
+    {
+      "text": "room name",
+      "nuf": "NUF_1",
+      "weight": 1.0  (optional, weight of this example in the class mean)
+    }
+    The new prototypes are used from the next request on, by the other
+    workers after NUF_FEEDBACK_SYNC_SECONDS. A name confirmed twice for the
+    same class is only counted once. "model_version" selects the version to
+    update, by default the active one.
+    """
+    if not FEEDBACK_PATH:
+        return jsonify({"error": "Feedback is disabled on this server."}), 404
+
+    data = request.get_json()
+    if not data or not isinstance(data.get("text"), str) or not data["text"].strip():
+        return jsonify({"error": "Invalid input. JSON with 'text' and 'nuf' required."}), 400
+    version, error = get_version(data.get("model_version"))
+    if error:
+        return jsonify({"error": error}), 400
+    prototype_updater = version.prototype_updater
+    nuf = data.get("nuf")
+    if not isinstance(nuf, str):
+        return jsonify({"error": "'nuf' must be a string."}), 400
+    if nuf not in prototype_updater.counts:
+        return jsonify({"error": f"Unknown class {nuf!r}."}), 400
+    weight, error = parse_positive_number(data, "weight", 1.0)
+    if error:
+        return jsonify({"error": error}), 400
+
+    # swapping the reference is atomic, requests in flight finish on the old matrix
+    version.prototypes, updated = prototype_updater.add(data["text"], nuf, weight)
+    return {"nuf": nuf, "updated": updated, "count": prototype_updater.counts[nuf],
+            "model_version": version.name}, 200
+
+
+@app.route("/healthz", methods=["GET"])
+def healthz():
+    """Liveness: the process is up and serving, whether or not the model is loaded"""
+    return {"status": "ok"}, 200
+
+
+@app.route("/readyz", methods=["GET"])
+def readyz():
+    """
+    Readiness: 200 once the model is loaded and warmed up, 503 before
+    (or if loading failed), with the duration of every startup step
+    """
+    return startup.status(), 200 if startup.ready else 503
+
+
+@app.route("/cache", methods=["GET", "DELETE"])
+def cache():
+    """
+    GET returns the hit/miss/eviction counters of the embedding cache of
+    the active model version (or "?model_version=..."), DELETE empties it.
+    """
+    version, error = get_version(request.args.get("model_version"))
+    if error:
+        return jsonify({"error": error}), 400
+    if request.method == "DELETE":
+        version.encoder.cache.clear()
+    return version.encoder.cache.stats(), 200
+
+
+@app.route("/models", methods=["GET", "POST"])
+def models():
+    """
+    GET lists the loaded model versions, the active one and versions
+    that are loading or failed to load.
+    POST (NUF_MODEL_ADMIN=1 only) loads a version in the background:
+    {
+      "name": "v6",
+      "model_path": "./fine_tuned_model_for_NUF_clustering_v6",
+      "prototypes_path": "class_embeddings_v6.npy",
+      "projection_path": "projection_v6_128.npz",  (optional, fitted for this model)
+      "activate": true  (optional, false keeps it for pinned requests only)
+    }
+    The version becomes available once it loaded, warmed up and passed the
+    smoke set; requests in flight finish on the previous version. Versions
+    are per process: only run this with a single server process.
+    """
+    if request.method == "GET":
+        return registry.status(), 200
+    if not MODEL_ADMIN_ENABLED:
+        return jsonify({"error": "Model administration is disabled, set NUF_MODEL_ADMIN=1."}), 404
+
+    data = request.get_json() or {}
+    for field in ("name", "model_path", "prototypes_path"):
+        if not isinstance(data.get(field), str) or not data[field]:
+            return jsonify({"error": f"'{field}' is required."}), 400
+    projection_path = data.get("projection_path")
+    if projection_path is not None and not isinstance(projection_path, str):
+        return jsonify({"error": "'projection_path' must be a string."}), 400
+    try:
+        registry.load(data["name"], data["model_path"], data["prototypes_path"],
+                      activate=data.get("activate", True), projection_path=projection_path)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 409
+    return registry.status(), 202
+
+
+@app.route("/models/<name>/activate", methods=["POST"])
+def activate_model(name):
+    """Makes a loaded version the active one (NUF_MODEL_ADMIN=1 only)"""
+    if not MODEL_ADMIN_ENABLED:
+        return jsonify({"error": "Model administration is disabled, set NUF_MODEL_ADMIN=1."}), 404
+    try:
+        registry.activate(name)
+    except KeyError:
+        return jsonify({"error": f"Model version {name!r} is not loaded."}), 404
+    return registry.status(), 200
+
+
+@app.route("/models/<name>", methods=["DELETE"])
+def unload_model(name):
+    """Unloads a version that is not active (NUF_MODEL_ADMIN=1 only)"""
+    if not MODEL_ADMIN_ENABLED:
+        return jsonify({"error": "Model administration is disabled, set NUF_MODEL_ADMIN=1."}), 404
+    try:
+        registry.unload(name)
+    except KeyError:
+        return jsonify({"error": f"Model version {name!r} is not loaded."}), 404
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 409
+    return registry.status(), 200
+
+
+@app.route("/metrics", methods=["GET"])
+def metrics():
+    """
+    Per-stage timing histograms, request and batch size counters and cache
+    statistics in the Prometheus text format
+    """
+    return Response(REGISTRY.render(), mimetype="text/plain; version=0.0.4")
+
+
+@app.route("/debug/profiler", methods=["GET", "POST"])
+def debug_profiler():
+    """
+    Only available with NUF_PROFILER=1.
+    POST {"enabled": true, "interval_ms": 10} starts sampling (interval_ms at least 1),
+    {"enabled": false} stops it.
+    GET returns the collected stacks in collapsed format (flamegraph.pl / speedscope),
+    "?limit=N" keeps the N most frequent ones.
+    """
+    if not PROFILER_ENABLED:
+        return jsonify({"error": "Profiler is disabled, start the server with NUF_PROFILER=1."}), 404
+    if request.method == "GET":
+        limit = request.args.get("limit", type=int)
+        return Response(profiler.collapsed(limit), mimetype="text/plain")
+
+    data = request.get_json() or {}
+    # a shorter interval would busy-loop the sampler and starve the request threads
+    interval_ms, error = parse_positive_number(data, "interval_ms")
+    if not error and interval_ms is not None and interval_ms < PROFILER_MIN_INTERVAL_MS:
+        error = f"'interval_ms' must be at least {PROFILER_MIN_INTERVAL_MS}."
+    if error:
+        return jsonify({"error": error}), 400
+    if data.get("enabled", True):
+        profiler.start(interval_ms=interval_ms, reset=data.get("reset", True))
+    else:
+        profiler.stop()
+    return profiler.stats(), 200
 
-    formatted_response = json.dumps(response, indent=4)
-    print(formatted_response)
-    
-    return response, 200
 
 if __name__ == "__main__":
-    # Start the Flask development server
-    # "debug=True" auto-reloads on code changes
-    app.run(host="0.0.0.0", port=5002, debug=True)
+    # Start the Flask development server, for production use serve.py or
+    # gunicorn (see gunicorn.conf.py). NUF_DEBUG=1 enables the debugger
+    # and auto-reload on code changes.
+    debug = os.environ.get("NUF_DEBUG", "0") == "1"
+    logging.basicConfig(level=logging.DEBUG if debug else logging.INFO)
+    app.run(host="0.0.0.0", port=5002, debug=debug)
@@ -0,0 +1,89 @@
+"""
+Padding benchmark on the Bezeichnung and concat_text columns of
+data/NUF_data.csv, comparing three batch plans:
+
+    naive     fixed-size batches in catalogue order
+    fixed     what SentenceTransformer.encode does by itself: sorted by
+              character length, then fixed-size batches
+    bucketed  sorted by token length, batches by a padded token budget
+              (nuf_classifier/batching.py)
+
+Reports padded tokens and the mean padding ratio of each plan, the encode
+time of fixed vs. bucketed, and checks that both return the same
+embeddings in the same order.
+
+    python benchmarks/bench_bucketing.py
+    python benchmarks/bench_bucketing.py --backend stub   # no model weights, characters as tokens
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from nuf_classifier.backends import BACKENDS, load_model
+from nuf_classifier.batching import (DEFAULT_TOKEN_BUDGET, encode_bucketed, padding_ratio,
+                                     plan_batches, token_lengths)
+from nuf_classifier.catalogue import load_catalogue
+from nuf_classifier.text import to_model_text
+
+
+def fixed_batches(order, batch_size):
+    return [order[start:start + batch_size] for start in range(0, len(order), batch_size)]
+
+
+def padding(lengths, batches):
+    """(padded tokens, mean padding ratio) of a batch plan"""
+    padded = sum(len(batch) * int(lengths[batch].max()) for batch in batches)
+    return padded, float(np.mean([padding_ratio(lengths[batch]) for batch in batches]))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--model', default=os.path.join(ROOT, 'fine_tuned_model_for_NUF_clustering_v5'))
+    parser.add_argument('--backend', choices=BACKENDS, default='torch')
+    parser.add_argument('--catalogue', default=os.path.join(ROOT, 'data', 'NUF_data.csv'))
+    parser.add_argument('--batch-size', type=int, default=64)
+    parser.add_argument('--token-budget', type=int, default=DEFAULT_TOKEN_BUDGET)
+    parser.add_argument('--max-batch-size', type=int, help='cap on names per bucketed batch')
+    args = parser.parse_args()
+
+    model = load_model(args.model, args.backend, device='cpu')
+    entries = load_catalogue(args.catalogue)
+
+    print(f'{"column":<12} {"batching":<10} {"batches":>8} {"tokens":>8} {"padded":>8} '
+          f'{"padding":>8} {"seconds":>8}')
+    for column in ('Bezeichnung', 'concat_text'):
+        texts = [to_model_text(entry[column]) for entry in entries]
+        lengths = token_lengths(model, texts)
+        plans = {
+            'naive': fixed_batches(np.arange(len(texts)), args.batch_size),
+            'fixed': fixed_batches(np.argsort([-len(text) for text in texts], kind='stable'),
+                                   args.batch_size),
+            'bucketed': plan_batches(lengths, args.token_budget, args.max_batch_size)
+        }
+
+        start = time.perf_counter()
+        fixed = np.asarray(model.encode(texts, batch_size=args.batch_size, convert_to_numpy=True,
+                                        normalize_embeddings=True))
+        timings = {'fixed': time.perf_counter() - start}
+        start = time.perf_counter()
+        bucketed = encode_bucketed(model, texts, args.token_budget, args.max_batch_size,
+                                   normalize_embeddings=True)
+        timings['bucketed'] = time.perf_counter() - start
+
+        for name, batches in plans.items():
+            padded, ratio = padding(lengths, batches)
+            print(f'{column:<12} {name:<10} {len(batches):>8} {int(lengths.sum()):>8} {padded:>8} '
+                  f'{ratio:>8.1%} {timings.get(name, float("nan")):>8.2f}')
+        agreement = float(np.min(np.sum(fixed * bucketed, axis=1)))
+        print(f'{column:<12} lowest cosine similarity fixed vs. bucketed: {agreement:.6f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,95 @@
+"""
+Training-pair generation benchmark: the all-pairs combinations loop of
+model_training.ipynb versus the streaming samplers of
+nuf_classifier/training.py. Reports examples per second and the peak
+memory (tracemalloc) needed to hold one epoch as a list.
+
+    python benchmarks/bench_pairs.py
+    python benchmarks/bench_pairs.py --repeat-catalogue 4   # simulate a 4x larger vocabulary
+"""
+
+import argparse
+import os
+import sys
+import time
+import tracemalloc
+from itertools import combinations
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from nuf_classifier.catalogue import load_catalogue
+from nuf_classifier.training import PairSampler, TripletSampler, mine_hard_negatives
+
+
+class Example(object):
+    """Stand-in for InputExample so the benchmark runs without sentence-transformers"""
+    __slots__ = ('texts', 'label')
+
+    def __init__(self, texts, label):
+        self.texts = texts
+        self.label = label
+
+
+def example_factory():
+    try:
+        from sentence_transformers import InputExample
+        return lambda texts, label: InputExample(texts=texts, label=label)
+    except ImportError:
+        return Example
+
+
+def all_pairs(rows, make_example):
+    """The notebook's loop, on a list of dicts instead of df.iloc"""
+    examples = []
+    for i, j in combinations(range(len(rows)), 2):
+        row, row2 = rows[i], rows[j]
+        label = 1 if row['NUF'] == row2['NUF'] else 0
+        examples.append(make_example([row['concat_text'], row2['concat_text']], label))
+    return examples
+
+
+def measure(name, build):
+    tracemalloc.start()
+    start = time.perf_counter()
+    examples = build()
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f'{name:<28} {len(examples):>10} {elapsed:>9.3f} {len(examples) / elapsed:>14,.0f} '
+          f'{peak / 2**20:>10.1f}')
+    return examples
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--catalogue', default=os.path.join(ROOT, 'data', 'NUF_data.csv'))
+    parser.add_argument('--repeat-catalogue', type=int, default=1)
+    parser.add_argument('--skip-all-pairs', action='store_true')
+    args = parser.parse_args()
+
+    rows = load_catalogue(args.catalogue) * args.repeat_catalogue
+    texts = [row['concat_text'] for row in rows]
+    labels = [row['NUF'] for row in rows]
+    make_example = example_factory()
+    # random vectors stand in for model embeddings, mining cost does not depend on them
+    embeddings = np.random.default_rng(0).standard_normal((len(rows), 768)).astype(np.float32)
+
+    print(f'{len(rows)} catalogue rows')
+    print(f'{"generator":<28} {"examples":>10} {"seconds":>9} {"examples/s":>14} {"peak MiB":>10}')
+    if not args.skip_all_pairs:
+        measure('all pairs (notebook)', lambda: all_pairs(rows, make_example))
+
+    hard_negatives = measure('hard negative mining', lambda: mine_hard_negatives(
+        embeddings, labels, top_k=10))
+
+    measure('pair sampler', lambda: list(PairSampler(
+        texts, labels, hard_negatives=hard_negatives, example_factory=make_example)))
+    measure('triplet sampler', lambda: list(TripletSampler(
+        texts, labels, hard_negatives=hard_negatives, example_factory=make_example)))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,162 @@
+"""
+Accuracy of reduced-dimension, compact-precision embeddings on
+data/NUF_data.csv, writing JSON results:
+
+    python benchmarks/bench_projection.py --output projection_results.json
+    python benchmarks/bench_projection.py --backend stub   # no model weights
+
+The projection is fitted on the training rows of a stratified split
+(Bezeichnung and concat_text, like python -m nuf_classifier.projection) and
+every dimension is combined with every precision. The held-out Bezeichnung
+are classified in prototype mode and k-NN mode (index of the training
+rows), after a round trip through the cache / store format of the
+precision. The prototypes are built the way the service builds them: class
+means of the full-dimension training rows (the prototype file), then
+projected, then compressed. Reported per combination: top-1
+accuracy, top-1 agreement with the full float32 embeddings and bytes per
+vector. The recommendation is the smallest combination whose agreement
+reaches --min-agreement in both modes.
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from nuf_classifier.backends import BACKENDS, load_model
+from nuf_classifier.batching import encode_bucketed
+from nuf_classifier.catalogue import load_catalogue
+from nuf_classifier.evaluation import class_means, stratified_split
+from nuf_classifier.knn import CatalogueIndex
+from nuf_classifier.precision import PRECISIONS, pack, unpack
+from nuf_classifier.projection import Projection, catalogue_texts
+from nuf_classifier.prototypes import PrototypeMatrix
+from nuf_classifier.text import to_model_text
+
+
+def evaluate(train_entries, train_embeddings, test_embeddings, test_labels, precision, k,
+             projection=None):
+    """
+    Predicted labels of the test rows in prototype and k-NN mode, and bytes
+    per vector. The embeddings are the full-dimension model outputs.
+    """
+    classes, means = class_means(train_embeddings, [entry['NUF'] for entry in train_entries])
+    prototypes = PrototypeMatrix(classes, means)
+    if projection is not None:
+        # as in app.build_version: the stored prototypes are projected, not re-averaged
+        prototypes = prototypes.projected(projection)
+        train_embeddings = projection.transform(train_embeddings)
+        test_embeddings = projection.transform(test_embeddings)
+    prototypes = prototypes.compressed(precision)
+    # the round trip through pack/unpack is what cached and stored vectors go through
+    queries = np.stack([unpack(pack(vector, precision), precision) for vector in test_embeddings])
+    index = CatalogueIndex(train_entries, train_embeddings, precision=precision)
+    predicted = {
+        'prototype': [result['predicted_class']
+                      for result in prototypes.classify(test_labels, queries)],
+        'knn': [result['predicted_class'] for result in index.classify(test_labels, queries, k)]
+    }
+    return predicted, len(pack(test_embeddings[0], precision))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--model', default=os.path.join(ROOT, 'fine_tuned_model_for_NUF_clustering_v5'))
+    parser.add_argument('--backend', choices=BACKENDS, default='torch')
+    parser.add_argument('--catalogue', default=os.path.join(ROOT, 'data', 'NUF_data.csv'))
+    parser.add_argument('--dimensions', type=int, nargs='+', default=[32, 48, 64, 96, 128, 192, 256])
+    parser.add_argument('--precisions', choices=PRECISIONS, nargs='+', default=list(PRECISIONS))
+    parser.add_argument('--test-fraction', type=float, default=0.2)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--k', type=int, default=5)
+    parser.add_argument('--min-agreement', type=float, default=0.99)
+    parser.add_argument('--output', default='projection_results.json')
+    args = parser.parse_args()
+
+    model = load_model(args.model, args.backend, device='cpu')
+
+    def encode(texts):
+        return encode_bucketed(model, [to_model_text(text) for text in texts],
+                               normalize_embeddings=True).astype(np.float32)
+
+    entries = load_catalogue(args.catalogue)
+    labels = [entry['NUF'] for entry in entries]
+    train, test = stratified_split(labels, args.test_fraction, args.seed)
+    train_entries = [entries[index] for index in train]
+    test_labels = np.asarray([labels[index] for index in test])
+    embeddings = encode([entry['Bezeichnung'] for entry in entries])
+    fit_embeddings = encode(catalogue_texts(train_entries))
+
+    full, _ = evaluate(train_entries, embeddings[train], embeddings[test], test_labels, 'float32', args.k)
+    rows = []
+    for dimension in [None] + sorted(args.dimensions):
+        projection = None
+        if dimension is not None:
+            started = time.perf_counter()
+            projection = Projection.fit(fit_embeddings, dimension)
+            fit_seconds = time.perf_counter() - started
+        for precision in args.precisions:
+            predicted, vector_bytes = evaluate(train_entries, embeddings[train], embeddings[test],
+                                               test_labels, precision, args.k, projection)
+            row = {
+                "dimension": dimension or embeddings.shape[1],
+                "projected": projection is not None,
+                "precision": precision,
+                "bytes_per_vector": vector_bytes,
+                "explained_variance": (round(float(projection.explained_variance.sum()), 4)
+                                       if projection is not None else 1.0),
+                "fit_seconds": round(fit_seconds, 3) if projection is not None else None
+            }
+            for mode in ('prototype', 'knn'):
+                row[f"{mode}_top1_accuracy"] = round(float(np.mean(
+                    np.asarray(predicted[mode]) == test_labels)), 4)
+                row[f"{mode}_top1_agreement"] = round(float(np.mean(
+                    np.asarray(predicted[mode]) == np.asarray(full[mode]))), 4)
+            rows.append(row)
+
+    candidates = [row for row in rows
+                  if min(row["prototype_top1_agreement"], row["knn_top1_agreement"]) >= args.min_agreement]
+    recommended = min(candidates, key=lambda row: (row["bytes_per_vector"], -row["dimension"]),
+                      default=None)
+    results = {
+        "config": {
+            "backend": args.backend,
+            "model": os.path.basename(os.path.normpath(args.model)) if args.backend != 'stub' else None,
+            "catalogue_rows": len(entries),
+            "train_rows": len(train),
+            "test_rows": len(test),
+            "fit_texts": len(fit_embeddings),
+            "k": args.k,
+            "seed": args.seed,
+            "min_agreement": args.min_agreement
+        },
+        "results": rows,
+        "recommended": recommended
+    }
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=2, ensure_ascii=False)
+
+    print(f'{"dimension":>9} {"precision":<9} {"bytes":>6} {"variance":>8} '
+          f'{"proto acc":>9} {"proto agr":>9} {"knn acc":>8} {"knn agr":>8}')
+    for row in rows:
+        print(f'{row["dimension"]:>9} {row["precision"]:<9} {row["bytes_per_vector"]:>6} '
+              f'{row["explained_variance"]:>8.1%} {row["prototype_top1_accuracy"]:>9.3f} '
+              f'{row["prototype_top1_agreement"]:>9.3f} {row["knn_top1_accuracy"]:>8.3f} '
+              f'{row["knn_top1_agreement"]:>8.3f}')
+    if recommended is None:
+        print(f'No combination reaches {args.min_agreement:.0%} top-1 agreement, keep full float32')
+    else:
+        print(f'Smallest with {args.min_agreement:.0%} top-1 agreement: '
+              f'{recommended["dimension"]} dimensions as {recommended["precision"]} '
+              f'({recommended["bytes_per_vector"]} bytes per vector)')
+    print(f'Wrote {args.output}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,92 @@
+"""
+Microbenchmark: per-class sklearn cosine_similarity loop (old app.py path)
+versus one matrix product over the precomputed prototype matrix.
+
+Uses the real class_embeddings.json and random unit vectors as room name
+embeddings, so no model weights are needed:
+
+    python benchmarks/bench_scoring.py --repeat 200 --batch-sizes 1 64 1024
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from nuf_classifier.prototypes import PrototypeMatrix
+
+
+def legacy_scores(new_embedding, class_embeddings, cosine_similarity):
+    """Scoring loop as it was in app.py before the prototype matrix"""
+    class_scores = {}
+    for label, prototype in class_embeddings.items():
+        similarity = cosine_similarity(
+            new_embedding.reshape(1, -1),
+            prototype.reshape(1, -1)
+        )[0][0]
+        class_scores[label] = float(similarity)
+    return class_scores
+
+
+def timed(function, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--prototypes', default=os.path.join(ROOT, 'class_embeddings.json'))
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=[1, 16, 256])
+    parser.add_argument('--repeat', type=int, default=50)
+    args = parser.parse_args()
+
+    with open(args.prototypes, 'r') as f:
+        raw = json.load(f)
+    class_embeddings = {label: np.array(vector) for label, vector in raw.items()}
+    prototypes = PrototypeMatrix.from_dict(raw)
+
+    try:
+        from sklearn.metrics.pairwise import cosine_similarity
+    except ImportError:
+        cosine_similarity = None
+        print('scikit-learn is not installed, only the matrix path is measured')
+
+    rng = np.random.default_rng(0)
+    print(f'{"batch":>6} {"legacy ms":>10} {"matrix ms":>10} {"speedup":>8}')
+    for batch_size in args.batch_sizes:
+        embeddings = rng.standard_normal((batch_size, prototypes.dimension)).astype(np.float32)
+        embeddings /= np.linalg.norm(embeddings, axis=1, keepdims=True)
+        texts = ['room'] * batch_size
+
+        matrix_time = timed(lambda: prototypes.classify(texts, embeddings), args.repeat)
+        if cosine_similarity is None:
+            print(f'{batch_size:>6} {"-":>10} {matrix_time * 1e3:>10.3f} {"-":>8}')
+            continue
+
+        legacy_time = timed(
+            lambda: [legacy_scores(embedding, class_embeddings, cosine_similarity)
+                     for embedding in embeddings],
+            max(1, args.repeat // 10)
+        )
+
+        # both paths must agree on the scores
+        legacy = legacy_scores(embeddings[0], class_embeddings, cosine_similarity)
+        matrix = prototypes.classify(texts[:1], embeddings[:1])[0]['all_class_scores']
+        assert max(abs(legacy[label] - matrix[label]) for label in legacy) < 1e-5
+
+        print(f'{batch_size:>6} {legacy_time * 1e3:>10.3f} {matrix_time * 1e3:>10.3f} '
+              f'{legacy_time / matrix_time:>7.1f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,98 @@
+"""
+Accuracy and latency check of an encoder backend against the fp32 PyTorch
+model: both encode every Bezeichnung of data/NUF_data.csv, are scored
+against the class prototypes and the script reports how often the predicted
+NUF agrees, how close the embeddings are, and the encode speed of each.
+
+    python benchmarks/check_backend.py --backend int8
+    python benchmarks/check_backend.py --backend onnx --json results.json
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from nuf_classifier.backends import BACKENDS, load_model
+from nuf_classifier.catalogue import load_catalogue
+from nuf_classifier.prototypes import PrototypeMatrix
+from nuf_classifier.text import to_model_text
+
+
+def encode(model, texts, batch_size):
+    return np.asarray(model.encode(texts, batch_size=batch_size, convert_to_numpy=True,
+                                   normalize_embeddings=True), dtype=np.float32)
+
+
+def measure(model, texts, batch_size, single_samples):
+    start = time.perf_counter()
+    embeddings = encode(model, texts, batch_size)
+    throughput = len(texts) / (time.perf_counter() - start)
+
+    latencies = []
+    for text in texts[:single_samples]:
+        start = time.perf_counter()
+        encode(model, [text], 1)
+        latencies.append(time.perf_counter() - start)
+    latencies.sort()
+    return embeddings, {
+        "names_per_second": round(throughput, 1),
+        "single_p50_ms": round(latencies[len(latencies) // 2] * 1e3, 2),
+        "single_p99_ms": round(latencies[min(len(latencies) - 1, int(0.99 * len(latencies)))] * 1e3, 2)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--backend', choices=[b for b in BACKENDS if b != 'torch'], required=True)
+    parser.add_argument('--model', default=os.path.join(ROOT, 'fine_tuned_model_for_NUF_clustering_v5'))
+    parser.add_argument('--prototypes', default=os.path.join(ROOT, 'class_embeddings.json'))
+    parser.add_argument('--catalogue', default=os.path.join(ROOT, 'data', 'NUF_data.csv'))
+    parser.add_argument('--onnx-file', default=None)
+    parser.add_argument('--batch-size', type=int, default=64)
+    parser.add_argument('--single-samples', type=int, default=100,
+                        help='names encoded one by one for the latency figures')
+    parser.add_argument('--json', help='also write the results to this file')
+    args = parser.parse_args()
+
+    entries = load_catalogue(args.catalogue)
+    texts = [to_model_text(entry['Bezeichnung']) for entry in entries]
+    labels = np.array([entry['NUF'] for entry in entries])
+    prototypes = PrototypeMatrix.load(args.prototypes)
+
+    results = {"backend": args.backend, "names": len(texts)}
+    predictions = {}
+    embeddings = {}
+    for backend in ('torch', args.backend):
+        model = load_model(args.model, backend, device='cpu', onnx_file_name=args.onnx_file)
+        embeddings[backend], results[backend] = measure(
+            model, texts, args.batch_size, args.single_samples)
+        similarities = prototypes.similarities(embeddings[backend])
+        predictions[backend] = prototypes.labels[similarities.argmax(axis=1)]
+        results[backend]["catalogue_accuracy"] = round(float((predictions[backend] == labels).mean()), 4)
+        del model
+
+    cosine = (embeddings['torch'] * embeddings[args.backend]).sum(axis=1)
+    results["agreement_with_fp32"] = round(float((predictions['torch'] == predictions[args.backend]).mean()), 4)
+    results["embedding_cosine_mean"] = round(float(cosine.mean()), 5)
+    results["embedding_cosine_min"] = round(float(cosine.min()), 5)
+    disagreements = np.flatnonzero(predictions['torch'] != predictions[args.backend])
+    results["disagreements"] = [
+        {"text": texts[i], "fp32": str(predictions['torch'][i]), args.backend: str(predictions[args.backend][i])}
+        for i in disagreements[:20]
+    ]
+
+    print(json.dumps(results, indent=2, ensure_ascii=False))
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2, ensure_ascii=False)
+
+
+if __name__ == '__main__':
+    main()
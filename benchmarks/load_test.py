@@ -0,0 +1,127 @@
+"""
+Local load test of the prediction service: several client threads with
+keep-alive connections send room names from data/NUF_data.csv and the
+script reports latency percentiles and requests per second.
+
+    python serve.py &
+    python benchmarks/load_test.py --concurrency 8 --duration 30
+    python benchmarks/load_test.py --endpoint /predict_batch --batch 50
+    python benchmarks/load_test.py --names repeat --lexical   # cache and lexical hits
+
+By default every name is a catalogue name with a unique suffix ("Büro 3.17")
+and is sent with "lexical": false, so each one goes through the model and
+the micro-batcher: the plain catalogue names would all be exact lexical
+matches, and after the first pass embedding cache hits.
+"""
+
+import argparse
+import csv
+import http.client
+import json
+import os
+import random
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def load_names(path):
+    with open(path, 'r', encoding='utf-8', newline='') as f:
+        return [row['Bezeichnung'] for row in csv.DictReader(f) if row.get('Bezeichnung')]
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return float('nan')
+    index = min(len(sorted_values) - 1, int(round(fraction * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def client(args, names, deadline, latencies, errors, seed):
+    rng = random.Random(seed)
+    sent = [0]
+    connection = http.client.HTTPConnection(args.host, args.port, timeout=args.timeout)
+    headers = {'Content-Type': 'application/json'}
+
+    def next_name():
+        name = rng.choice(names)
+        if args.names == 'repeat':
+            return name
+        sent[0] += 1
+        # unique per thread and request, so neither cache nor store can answer it
+        return f'{name} {seed}.{sent[0]}'
+
+    while time.perf_counter() < deadline:
+        if args.endpoint == '/predict_batch':
+            body = {'texts': [next_name() for _ in range(args.batch)]}
+        else:
+            body = {'text': next_name()}
+        if args.mode:
+            body['mode'] = args.mode
+        if not args.lexical:
+            body['lexical'] = False
+        start = time.perf_counter()
+        try:
+            connection.request('POST', args.endpoint, json.dumps(body), headers)
+            response = connection.getresponse()
+            response.read()
+            if response.status != 200:
+                errors.append(response.status)
+                continue
+        except (OSError, http.client.HTTPException) as error:
+            errors.append(repr(error))
+            connection.close()
+            connection = http.client.HTTPConnection(args.host, args.port, timeout=args.timeout)
+            continue
+        latencies.append(time.perf_counter() - start)
+    connection.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=5002)
+    parser.add_argument('--endpoint', default='/predict', choices=['/predict', '/predict_batch'])
+    parser.add_argument('--batch', type=int, default=50, help='names per /predict_batch request')
+    parser.add_argument('--mode', choices=['prototype', 'knn'])
+    parser.add_argument('--names-from', dest='names_path',
+                        default=os.path.join(ROOT, 'data', 'NUF_data.csv'))
+    parser.add_argument('--names', choices=['unique', 'repeat'], default='unique',
+                        help='unique suffixed names (model serving) or the catalogue names as they are')
+    parser.add_argument('--lexical', action='store_true',
+                        help='let catalogue matches skip the model (off by default)')
+    parser.add_argument('--concurrency', type=int, default=4)
+    parser.add_argument('--duration', type=float, default=20.0, help='seconds')
+    parser.add_argument('--timeout', type=float, default=60.0)
+    args = parser.parse_args()
+
+    names = load_names(args.names_path)
+    latencies, errors = [], []
+    deadline = time.perf_counter() + args.duration
+    threads = [
+        threading.Thread(target=client, args=(args, names, deadline, latencies, errors, seed))
+        for seed in range(args.concurrency)
+    ]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    names_per_request = args.batch if args.endpoint == '/predict_batch' else 1
+    print(f'endpoint      {args.endpoint}  concurrency {args.concurrency}  '
+          f'names {args.names}  lexical {"on" if args.lexical else "off"}')
+    print(f'requests      {len(latencies)}  errors {len(errors)}')
+    print(f'requests/s    {len(latencies) / elapsed:.1f}')
+    print(f'names/s       {len(latencies) * names_per_request / elapsed:.1f}')
+    for label, fraction in (('p50', 0.5), ('p90', 0.9), ('p99', 0.99)):
+        print(f'{label} latency   {percentile(latencies, fraction) * 1e3:.1f} ms')
+    if errors:
+        print('first errors  ', errors[:5])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,97 @@
+"""
+Headless accuracy and latency benchmark over data/NUF_data.csv, writing
+JSON results:
+
+    python benchmarks/run_suite.py --output results.json
+    python benchmarks/run_suite.py --backend stub --output ci.json   # no model weights
+
+Accuracy is measured on a stratified held-out split: prototypes are the
+class means of the training rows (or --prototypes to score the shipped
+class_embeddings.json, which were built from all rows). Speed is measured
+as encode throughput and per-call p50/p99 latency at several batch sizes.
+Intra/inter-class similarity statistics are accumulated blockwise.
+"""
+
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from nuf_classifier.backends import BACKENDS, load_model
+from nuf_classifier.catalogue import load_catalogue
+from nuf_classifier.evaluation import (class_means, classification_report, latency_profile,
+                                       similarity_statistics, stratified_split)
+from nuf_classifier.prototypes import PrototypeMatrix
+from nuf_classifier.text import to_model_text
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--model', default=os.path.join(ROOT, 'fine_tuned_model_for_NUF_clustering_v5'))
+    parser.add_argument('--backend', choices=BACKENDS, default='torch')
+    parser.add_argument('--catalogue', default=os.path.join(ROOT, 'data', 'NUF_data.csv'))
+    parser.add_argument('--prototypes', help='score these prototypes instead of train-split means')
+    parser.add_argument('--test-fraction', type=float, default=0.2)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--top-k', type=int, default=3)
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=[1, 8, 32, 128])
+    parser.add_argument('--latency-names', type=int, default=512)
+    parser.add_argument('--output', default='benchmark_results.json')
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    model = load_model(args.model, args.backend, device='cpu')
+
+    def encode(texts):
+        return np.asarray(model.encode([to_model_text(text) for text in texts], batch_size=len(texts),
+                                       convert_to_numpy=True, normalize_embeddings=True),
+                          dtype=np.float32)
+
+    entries = load_catalogue(args.catalogue)
+    texts = [entry['Bezeichnung'] for entry in entries]
+    labels = np.array([entry['NUF'] for entry in entries])
+    embeddings = np.concatenate([encode(texts[i:i + 128]) for i in range(0, len(texts), 128)])
+
+    train, test = stratified_split(labels.tolist(), args.test_fraction, args.seed)
+    if args.prototypes:
+        prototypes = PrototypeMatrix.load(args.prototypes)
+    else:
+        classes, means = class_means(embeddings[train], labels[train])
+        prototypes = PrototypeMatrix(classes, means)
+
+    results = {
+        "config": {
+            "backend": args.backend,
+            "model": os.path.basename(os.path.normpath(args.model)) if args.backend != 'stub' else None,
+            "prototypes": args.prototypes or "train split class means",
+            "catalogue_rows": len(entries),
+            "train_rows": len(train),
+            "test_rows": len(test),
+            "seed": args.seed,
+            "python": platform.python_version(),
+            "machine": platform.machine()
+        },
+        "accuracy": classification_report(
+            prototypes.similarities(embeddings[test]), prototypes.labels, labels[test], args.top_k),
+        "similarity": similarity_statistics(embeddings, labels),
+        "latency": latency_profile(encode, texts, args.batch_sizes, args.latency_names)
+    }
+    results["config"]["seconds"] = round(time.perf_counter() - started, 2)
+
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=2, ensure_ascii=False)
+    accuracy = results["accuracy"]
+    print(f'top-1 {accuracy["top1_accuracy"]:.3f}  top-{args.top_k} '
+          f'{accuracy[f"top{args.top_k}_accuracy"]:.3f}  separation '
+          f'{results["similarity"]["separation"]:.3f}  -> {args.output}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,38 @@
+"""
+gunicorn settings for the prediction service (Linux only):
+
+    gunicorn -c gunicorn.conf.py
+
+With preload_app the model is loaded once in the master process and shared
+with the forked workers copy-on-write. Set NUF_PRELOAD=0 to load it in every
+worker instead, e.g. when using CUDA, which does not survive a fork.
+"""
+
+import os
+
+wsgi_app = "app:app"
+bind = f"{os.environ.get('NUF_HOST', '0.0.0.0')}:{os.environ.get('NUF_PORT', 5002)}"
+
+workers = int(os.environ.get("NUF_WORKERS", 2))
+
+# Model versions loaded through POST /models only exist in the worker that
+# received the request, the others would answer 404 or with the old model
+if os.environ.get("NUF_MODEL_ADMIN", "0") == "1" and workers > 1:
+    raise RuntimeError("NUF_MODEL_ADMIN=1 needs a single process, set NUF_WORKERS=1 "
+                       "(and raise NUF_THREADS) or serve with python serve.py")
+threads = int(os.environ.get("NUF_THREADS", 4))
+worker_class = "gthread"
+preload_app = os.environ.get("NUF_PRELOAD", "1") == "1"
+
+# A loader thread would not survive the fork, so with preload_app the master
+# loads and warms up the model before the workers start. Without it, every
+# worker accepts connections right away and loads in the background.
+if preload_app:
+    os.environ.setdefault("NUF_BACKGROUND_LOAD", "0")
+
+# Model inference can take a while for large batches
+timeout = int(os.environ.get("NUF_TIMEOUT", 120))
+
+# No per-request access log on the hot path unless asked for
+accesslog = os.environ.get("NUF_ACCESS_LOG") or None
+loglevel = os.environ.get("NUF_LOG_LEVEL", "info")
@@ -0,0 +1 @@
+"""Reusable inference helpers for the NUF room classifier service."""
@@ -0,0 +1,118 @@
+"""
+Encoder backends for CPU-only servers. All of them return an object with
+the SentenceTransformer encode() interface:
+
+    torch   full fp32 PyTorch model (default)
+    onnx    ONNX Runtime via sentence-transformers' onnx backend, exported
+            from the PyTorch weights on the first start if the model folder
+            has no onnx/model.onnx yet and saved there, so later starts load
+            it directly (needs optimum and onnxruntime)
+    int8    PyTorch model with dynamically int8-quantized Linear layers
+    stub    HashingEncoder, character n-gram hashing without model weights,
+            for CI runs of the benchmarks and the service
+
+Heavy imports happen inside load_model, so importing this module is cheap.
+"""
+
+import hashlib
+import logging
+import os
+import shutil
+import tempfile
+
+import numpy as np
+
+BACKENDS = ('torch', 'onnx', 'int8', 'stub')
+
+logger = logging.getLogger(__name__)
+
+
+class HashingEncoder(object):
+    """
+    Deterministic stand-in for the sentence transformer: every character
+    trigram of a name is hashed into one of `dimension` signed buckets.
+    Names sharing many trigrams get similar vectors, so benchmark numbers
+    are meaningful without being comparable to the real model.
+    """
+
+    def __init__(self, dimension=768, ngram=3):
+        self.dimension = dimension
+        self.ngram = ngram
+
+    def get_sentence_embedding_dimension(self):
+        return self.dimension
+
+    def _vector(self, text):
+        vector = np.zeros(self.dimension, dtype=np.float32)
+        padded = f' {text} '
+        for start in range(max(1, len(padded) - self.ngram + 1)):
+            digest = hashlib.md5(padded[start:start + self.ngram].encode('utf-8')).digest()
+            bucket = int.from_bytes(digest[:4], 'little') % self.dimension
+            vector[bucket] += 1.0 if digest[4] & 1 else -1.0
+        return vector
+
+    def encode(self, sentences, batch_size=32, convert_to_numpy=True,
+               normalize_embeddings=False, **kwargs):
+        single = isinstance(sentences, str)
+        vectors = np.stack([self._vector(text) for text in ([sentences] if single else sentences)])
+        if normalize_embeddings:
+            vectors /= np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+        return vectors[0] if single else vectors
+
+
+def default_device():
+    import torch
+    return 'cuda' if torch.cuda.is_available() else 'cpu'
+
+
+def _save_onnx_export(model, model_path):
+    """
+    Saves a model that was just exported to ONNX as model_path/onnx, where
+    sentence-transformers looks for it. Written to a temporary folder and
+    renamed, so workers starting at the same time never see half a file.
+    """
+    target = os.path.join(model_path, 'onnx')
+    try:
+        temporary = tempfile.mkdtemp(prefix='onnx-', dir=model_path)
+    except OSError as e:
+        logger.warning('Could not save the ONNX export of %s, it is exported again on the next '
+                       'start: %s', model_path, e)
+        return
+    try:
+        model[0].auto_model.save_pretrained(temporary)
+        os.rename(temporary, target)
+        logger.info('Saved the ONNX export of %s to %s', model_path, target)
+    except OSError as e:
+        # another process saved it first, or the folder is read-only
+        logger.warning('Could not save the ONNX export of %s: %s', model_path, e)
+    finally:
+        shutil.rmtree(temporary, ignore_errors=True)
+
+
+def load_model(model_path, backend='torch', device=None, onnx_file_name=None):
+    """Load the sentence transformer at model_path with the given backend"""
+    if backend not in BACKENDS:
+        raise ValueError(f'Unknown backend {backend!r}, expected one of {BACKENDS}')
+    if backend == 'stub':
+        return HashingEncoder()
+    from sentence_transformers import SentenceTransformer
+
+    if backend == 'torch':
+        return SentenceTransformer(model_path, device=device or default_device())
+
+    if backend == 'onnx':
+        model_kwargs = {'file_name': onnx_file_name} if onnx_file_name else None
+        export = (onnx_file_name is None and os.path.isdir(model_path)
+                  and not os.path.exists(os.path.join(model_path, 'onnx', 'model.onnx')))
+        model = SentenceTransformer(model_path, device='cpu', backend='onnx',
+                                    model_kwargs=model_kwargs)
+        if export:
+            _save_onnx_export(model, model_path)
+        return model
+
+    import torch
+    model = SentenceTransformer(model_path, device='cpu')
+    # Weights of all Linear layers stored as int8, activations quantized on the fly
+    quantized = torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+    logger.info('Loaded %s with dynamically int8-quantized Linear layers', model_path)
+    return quantized
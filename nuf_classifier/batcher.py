@@ -0,0 +1,131 @@
+"""
+Dynamic micro-batching: concurrent single-name requests are collected for
+up to max_batch_size names or max_wait_ms milliseconds, whichever comes
+first, and encoded with one batched model call.
+"""
+
+import asyncio
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+
+class MicroBatcher(object):
+    """
+    Runs an asyncio event loop in a background thread. Request threads call
+    encode(), which puts every name on the loop's queue and waits for its
+    future; the collector coroutine drains the queue into batches and runs
+    encode_fn(texts) -> (n, d) array on a dedicated model thread.
+
+    The loop is started lazily in the current process, so the batcher can be
+    created before gunicorn forks its workers.
+    """
+
+    def __init__(self, encode_fn, max_batch_size=32, max_wait_ms=5.0, timeout=60.0):
+        self.encode_fn = encode_fn
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait_ms / 1000.0
+        self.timeout = timeout
+        self.batches = 0
+        self.items = 0
+        self._lock = threading.Lock()
+        self._pid = None
+        self._loop = None
+        self._queue = None
+
+    def _ensure_started(self):
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            started = threading.Event()
+            self._loop = asyncio.new_event_loop()
+            self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='nuf-encode')
+            thread = threading.Thread(target=self._run, args=(started,),
+                                      name='nuf-microbatcher', daemon=True)
+            thread.start()
+            started.wait()
+            self._pid = os.getpid()
+
+    def _run(self, started):
+        asyncio.set_event_loop(self._loop)
+        self._queue = asyncio.Queue()
+        self._loop.create_task(self._collect())
+        self._loop.call_soon(started.set)
+        self._loop.run_forever()
+        # stopped by close(): cancel the collector and release the loop
+        tasks = asyncio.all_tasks(self._loop)
+        for task in tasks:
+            task.cancel()
+        self._loop.run_until_complete(asyncio.gather(*tasks, return_exceptions=True))
+        self._loop.close()
+
+    async def _collect(self):
+        while True:
+            batch = [await self._queue.get()]
+            deadline = self._loop.time() + self.max_wait
+            while len(batch) < self.max_batch_size:
+                remaining = deadline - self._loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._queue.get(), remaining))
+                except asyncio.TimeoutError:
+                    break
+            await self._encode_batch(batch)
+
+    async def _encode_batch(self, batch):
+        texts = [text for text, _ in batch]
+        try:
+            embeddings = await self._loop.run_in_executor(self._executor, self.encode_fn, texts)
+        except Exception as error:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(error)
+            return
+        self.batches += 1
+        self.items += len(batch)
+        for (_, future), embedding in zip(batch, embeddings):
+            if not future.done():
+                future.set_result(embedding)
+
+    async def submit(self, text):
+        """Embedding of one name, to be awaited on the batcher's loop"""
+        future = self._loop.create_future()
+        await self._queue.put((text, future))
+        return await future
+
+    async def _submit_many(self, texts):
+        return await asyncio.gather(*(self.submit(text) for text in texts))
+
+    def encode(self, texts):
+        """Blocking call for request threads, returns an (n, d) array"""
+        self._ensure_started()
+        embeddings = asyncio.run_coroutine_threadsafe(
+            self._submit_many(texts), self._loop
+        ).result(self.timeout)
+        return np.stack(embeddings)
+
+    def stats(self):
+        return {
+            "batches": self.batches,
+            "items": self.items,
+            "mean_batch_size": round(self.items / self.batches, 2) if self.batches else 0.0,
+            "max_batch_size": self.max_batch_size,
+            "max_wait_ms": self.max_wait * 1000
+        }
+
+    def close(self):
+        """
+        Stops the loop thread of this process. A later encode() call starts
+        a new one, so requests still holding the batcher do not hang.
+        """
+        with self._lock:
+            if self._pid != os.getpid():
+                return
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._executor.shutdown(wait=False)
+            self._pid = None
@@ -0,0 +1,98 @@
+"""
+Length-bucketed batching for model.encode.
+
+Room names range from "wc" to long concat_text entries, and every batch is
+padded to its longest sequence. Names are therefore sorted by token length
+and cut into batches by a budget of padded tokens instead of a fixed number
+of names: many short names share one batch, long names get small batches.
+The embeddings are returned in the original order.
+"""
+
+import logging
+
+import numpy as np
+
+from .metrics import ENCODE_BATCH_SIZE, ENCODE_PADDING_RATIO, STAGE_SECONDS
+
+logger = logging.getLogger(__name__)
+
+# Padded tokens per transformer batch, e.g. 64 names of up to 64 tokens
+DEFAULT_TOKEN_BUDGET = 4096
+
+
+def token_lengths(model, texts):
+    """
+    Tokens per text including special tokens, capped at the model's
+    max_seq_length. Models without a tokenizer (stub backend) count characters.
+    """
+    tokenizer = getattr(model, 'tokenizer', None)
+    max_length = getattr(model, 'max_seq_length', None)
+    if tokenizer is None:
+        lengths = [len(text) for text in texts]
+    else:
+        options = {'truncation': True, 'max_length': max_length} if max_length else {}
+        input_ids = tokenizer(list(texts), add_special_tokens=True, **options)['input_ids']
+        lengths = [len(ids) for ids in input_ids]
+    if max_length:
+        lengths = [min(length, max_length) for length in lengths]
+    return np.asarray(lengths, dtype=np.int64)
+
+
+def plan_batches(lengths, token_budget=DEFAULT_TOKEN_BUDGET, max_batch_size=None):
+    """
+    Index arrays of the batches, longest texts first. Each batch holds as
+    many texts as fit into token_budget padded tokens (at least one),
+    at most max_batch_size. Without a token_budget only the order changes.
+    """
+    lengths = np.asarray(lengths)
+    order = np.argsort(-lengths, kind='stable')
+    batches = []
+    start = 0
+    while start < len(order):
+        # sorted descending, so the first text is the longest of its batch
+        if token_budget:
+            size = max(1, token_budget // max(int(lengths[order[start]]), 1))
+        else:
+            size = max_batch_size or len(order)
+        if max_batch_size:
+            size = min(size, max_batch_size)
+        batches.append(order[start:start + size])
+        start += size
+    return batches
+
+
+def padding_ratio(lengths):
+    """Share of padding tokens in a batch padded to its longest text"""
+    lengths = np.asarray(lengths)
+    padded = len(lengths) * int(lengths.max()) if len(lengths) else 0
+    return 1.0 - float(lengths.sum()) / padded if padded else 0.0
+
+
+def encode_bucketed(model, texts, token_budget=DEFAULT_TOKEN_BUDGET, max_batch_size=None,
+                    **encode_kwargs):
+    """
+    model.encode over length-sorted, token-budgeted batches, returns the
+    embeddings (n, d) in the order of texts. encode_kwargs are passed on,
+    e.g. normalize_embeddings=True.
+    """
+    texts = list(texts)
+    if not texts:
+        return np.empty((0, model.get_sentence_embedding_dimension()), dtype=np.float32)
+    with STAGE_SECONDS.time(stage='measure'):
+        lengths = token_lengths(model, texts)
+
+    embeddings = None
+    for batch in plan_batches(lengths, token_budget, max_batch_size):
+        ratio = padding_ratio(lengths[batch])
+        ENCODE_BATCH_SIZE.observe(len(batch))
+        ENCODE_PADDING_RATIO.observe(ratio)
+        logger.debug('Encoding %d names of up to %d tokens, padding ratio %.2f',
+                     len(batch), lengths[batch[0]], ratio)
+        batch_embeddings = np.asarray(model.encode(
+            [texts[index] for index in batch], batch_size=len(batch),
+            convert_to_numpy=True, **encode_kwargs))
+        if embeddings is None:
+            embeddings = np.empty((len(texts), batch_embeddings.shape[1]),
+                                  dtype=batch_embeddings.dtype)
+        embeddings[batch] = batch_embeddings
+    return embeddings
@@ -0,0 +1,246 @@
+"""
+Offline bulk classification of exported room schedules.
+
+    python -m nuf_classifier.bulk rooms.csv classified.csv --column Name --workers 4
+    python -m nuf_classifier.bulk rooms.jsonl classified.jsonl --column name
+
+The input (CSV or JSON lines) is streamed in chunks. Names of a chunk are
+deduplicated by the text the model sees and answered from a bounded result
+cache, the catalogue lookup, or the model. The unique names left for the
+model are sharded across a process pool where every worker loads the model
+and prototypes once. Rows are written back in input order as soon as their
+chunk is done, so memory stays flat for any file size.
+"""
+
+import argparse
+import csv
+import json
+import os
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+from .backends import BACKENDS, load_model
+from .batching import DEFAULT_TOKEN_BUDGET, encode_bucketed
+from .cache import LRUCache
+from .catalogue import CATALOGUE_PATH, load_catalogue
+from .lexical import LexicalIndex
+from .prototypes import PrototypeMatrix
+from .text import to_model_text
+
+OUTPUT_FIELDS = ('predicted_class', 'confidence_percentage', 'predicted_nc', 'path')
+
+# Model and prototypes of the current worker process, set by _init_worker
+_worker = {}
+
+
+def _init_worker(model_path, backend, prototypes_path, batch_size, torch_threads, token_budget):
+    # the stub backend runs without torch
+    if torch_threads and backend != 'stub':
+        import torch
+        torch.set_num_threads(torch_threads)
+    _worker['model'] = load_model(model_path, backend, device='cpu')
+    _worker['prototypes'] = PrototypeMatrix.load(prototypes_path)
+    _worker['batch_size'] = batch_size
+    _worker['token_budget'] = token_budget
+
+
+def _classify_shard(texts):
+    """Model predictions for a list of names, runs in a worker process"""
+    model = _worker['model']
+    embeddings = encode_bucketed(
+        model,
+        [to_model_text(text) for text in texts],
+        _worker['token_budget'],
+        _worker['batch_size'],
+        normalize_embeddings=True
+    )
+    return [_compact(result, 'model') for result in _worker['prototypes'].classify(texts, embeddings)]
+
+
+def _compact(result, path):
+    return {
+        'predicted_class': result['predicted_class'],
+        'confidence_percentage': result['confidence_percentage'],
+        'predicted_nc': result.get('predicted_nc', ''),
+        'path': path
+    }
+
+
+def read_records(path, column):
+    """Yields (record, name) from a CSV file or JSON lines file"""
+    if path.endswith(('.jsonl', '.ndjson')):
+        with open(path, 'r', encoding='utf-8') as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                record = json.loads(line)
+                if isinstance(record, str):
+                    record = {column: record}
+                yield record, str(record.get(column) or '')
+        return
+    with open(path, 'r', encoding='utf-8-sig', newline='') as f:
+        for record in csv.DictReader(f):
+            yield record, record.get(column) or ''
+
+
+class RecordWriter(object):
+    """Writes classified records as CSV or JSON lines, depending on the extension"""
+
+    def __init__(self, path):
+        self._file = open(path, 'w', encoding='utf-8', newline='')
+        self._jsonl = path.endswith(('.jsonl', '.ndjson'))
+        self._csv = None
+
+    def write(self, record):
+        if self._jsonl:
+            self._file.write(json.dumps(record, ensure_ascii=False) + '\n')
+            return
+        if self._csv is None:
+            self._csv = csv.DictWriter(self._file, fieldnames=list(record), extrasaction='ignore')
+            self._csv.writeheader()
+        self._csv.writerow(record)
+
+    def close(self):
+        self._file.close()
+
+
+def _shards(items, count):
+    size = max(1, -(-len(items) // count))
+    return [items[start:start + size] for start in range(0, len(items), size)]
+
+
+class BulkClassifier(object):
+    """Chunked, deduplicated classification with an optional process pool"""
+
+    def __init__(self, model_path, prototypes_path, backend='torch', workers=0,
+                 batch_size=64, cache_size=100000, lexical_index=None,
+                 token_budget=DEFAULT_TOKEN_BUDGET):
+        self.workers = workers
+        self.results = LRUCache(cache_size)
+        self.lexical_index = lexical_index
+        torch_threads = max(1, (os.cpu_count() or 1) // workers) if workers else 0
+        init_args = (model_path, backend, prototypes_path, batch_size, torch_threads, token_budget)
+        if workers:
+            self._pool = ProcessPoolExecutor(workers, initializer=_init_worker, initargs=init_args)
+        else:
+            self._pool = None
+            _init_worker(*init_args)
+
+    def submit(self, names):
+        """
+        Starts classifying one chunk of names, returns a handle for collect().
+        Cached and lexically matched names are resolved right away.
+        """
+        resolved = {}
+        pending = {}
+        for name in names:
+            key = to_model_text(name)
+            if not key or key in resolved or key in pending:
+                continue
+            result = self.results.get(key)
+            if result is None and self.lexical_index is not None:
+                match = self.lexical_index.lookup(name)
+                if match:
+                    result = _compact(self.lexical_index.build_result(name, match), match['path'])
+                    self.results.put(key, result)
+            if result is None:
+                pending[key] = name
+            else:
+                resolved[key] = result
+
+        keys, texts = list(pending), list(pending.values())
+        if self._pool is None:
+            futures = [_classify_shard(texts)] if texts else []
+            shard_keys = [keys] if texts else []
+        else:
+            shard_keys = _shards(keys, self.workers)
+            futures = [self._pool.submit(_classify_shard, shard)
+                       for shard in _shards(texts, self.workers)]
+        return resolved, shard_keys, futures
+
+    def collect(self, handle):
+        """{model text: result} for a chunk started with submit()"""
+        resolved, shard_keys, futures = handle
+        for keys, future in zip(shard_keys, futures):
+            results = future if isinstance(future, list) else future.result()
+            for key, result in zip(keys, results):
+                self.results.put(key, result)
+                resolved[key] = result
+        return resolved
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.shutdown()
+
+
+def classify_file(classifier, input_path, output_path, column, chunk_size=5000, pipeline_depth=2):
+    """
+    Streams input_path through the classifier and writes every record with
+    the OUTPUT_FIELDS added, in input order. Up to pipeline_depth chunks are
+    in flight, so reading and writing overlap with the workers.
+    Returns the number of written records.
+    """
+    records = read_records(input_path, column)
+    writer = RecordWriter(output_path)
+    in_flight = deque()
+    written = 0
+
+    def flush_oldest():
+        chunk, handle = in_flight.popleft()
+        results = classifier.collect(handle)
+        for record, name in chunk:
+            result = results.get(to_model_text(name)) or dict.fromkeys(OUTPUT_FIELDS, '')
+            record.update(result)
+            writer.write(record)
+        return len(chunk)
+
+    try:
+        while True:
+            chunk = list(islice(records, chunk_size))
+            if not chunk:
+                break
+            in_flight.append((chunk, classifier.submit([name for _, name in chunk])))
+            if len(in_flight) >= pipeline_depth:
+                written += flush_oldest()
+        while in_flight:
+            written += flush_oldest()
+    finally:
+        writer.close()
+    return written
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Classify a CSV / JSON lines file of room names')
+    parser.add_argument('input', help='.csv or .jsonl file')
+    parser.add_argument('output', help='.csv or .jsonl file')
+    parser.add_argument('--column', default='Name', help='column / key holding the room name')
+    parser.add_argument('--model', default='./fine_tuned_model_for_NUF_clustering_v5')
+    parser.add_argument('--prototypes', default='class_embeddings.npy')
+    parser.add_argument('--backend', choices=BACKENDS, default='torch')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                        help='model processes, 0 classifies in this process')
+    parser.add_argument('--chunk-size', type=int, default=5000)
+    parser.add_argument('--batch-size', type=int, default=64,
+                        help='maximum names per transformer batch')
+    parser.add_argument('--token-budget', type=int, default=DEFAULT_TOKEN_BUDGET,
+                        help='padded tokens per transformer batch')
+    parser.add_argument('--cache-size', type=int, default=100000,
+                        help='results of distinct names kept across chunks')
+    parser.add_argument('--catalogue', default=CATALOGUE_PATH)
+    parser.add_argument('--no-lexical', action='store_true',
+                        help='send every name to the model, skipping the catalogue lookup')
+    args = parser.parse_args()
+
+    lexical_index = None if args.no_lexical else LexicalIndex(load_catalogue(args.catalogue))
+    classifier = BulkClassifier(args.model, args.prototypes, args.backend, args.workers,
+                                args.batch_size, args.cache_size, lexical_index, args.token_budget)
+    try:
+        written = classify_file(classifier, args.input, args.output, args.column, args.chunk_size)
+    finally:
+        classifier.close()
+    print(f'Classified {written} rows into {args.output}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,70 @@
+"""Bounded in-process LRU cache for room name embeddings."""
+
+import threading
+from collections import OrderedDict
+
+
+class LRUCache(object):
+    """
+    Thread-safe least-recently-used cache with hit/miss/eviction counters.
+
+    The cache is tagged with a version (fingerprint of the model and
+    prototype files); ensure_version() drops all entries when it changes.
+    maxsize=0 disables caching.
+    """
+
+    def __init__(self, maxsize=10000, version=None):
+        self.maxsize = maxsize
+        self.version = version
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._data)
+
+    def get(self, key, default=None):
+        with self._lock:
+            try:
+                value = self._data[key]
+            except KeyError:
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        if self.maxsize <= 0:
+            return
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def ensure_version(self, version):
+        """Drop all entries if they were computed for another version"""
+        with self._lock:
+            if version != self.version:
+                self._data.clear()
+                self.version = version
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "version": self.version
+        }
@@ -0,0 +1,14 @@
+"""Access to the NC catalogue in data/NUF_data.csv without pandas."""
+
+import csv
+
+CATALOGUE_PATH = './data/NUF_data.csv'
+
+
+def load_catalogue(path=CATALOGUE_PATH):
+    """
+    Rows of the catalogue as dicts with the columns NC, Bezeichnung, NUF,
+    bezeichnung_no_special_ch and concat_text.
+    """
+    with open(path, 'r', encoding='utf-8', newline='') as f:
+        return [row for row in csv.DictReader(f) if row.get('Bezeichnung')]
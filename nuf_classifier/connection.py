@@ -0,0 +1,47 @@
+"""
+SQLite connections that survive gunicorn's fork.
+
+SQLite connections must not be used across fork(): its POSIX locks belong
+to the process that took them, so a connection opened in the preloading
+master and inherited by the workers can corrupt the database. The
+connection is therefore opened lazily in the process that uses it, the
+same way MicroBatcher starts its event loop.
+"""
+
+import os
+import sqlite3
+import threading
+
+
+class ProcessConnection(object):
+    """
+    One SQLite connection per process, opened on first use with the given
+    schema statements. Use as `with connection.lock: connection.get()...`.
+    """
+
+    def __init__(self, path, *schema):
+        self.path = path
+        self.schema = schema
+        self.lock = threading.Lock()
+        self._pid = None
+        self._connection = None
+
+    def get(self):
+        """The connection of the current process, call with the lock held"""
+        if self._pid != os.getpid():
+            # an inherited connection is dropped without closing it, closing
+            # would touch the locks of the parent process
+            self._connection = sqlite3.connect(self.path, check_same_thread=False)
+            with self._connection:
+                self._connection.execute('PRAGMA journal_mode=WAL')
+                for statement in self.schema:
+                    self._connection.execute(statement)
+            self._pid = os.getpid()
+        return self._connection
+
+    def close(self):
+        with self.lock:
+            if self._connection is not None and self._pid == os.getpid():
+                self._connection.close()
+            self._connection = None
+            self._pid = None
@@ -0,0 +1,119 @@
+"""Embedding of room names with caching in front of the transformer."""
+
+import numpy as np
+
+from .batching import encode_bucketed
+from .metrics import ENCODE_BATCH_SIZE, STAGE_SECONDS
+from .precision import check_precision, pack, unpack
+from .text import to_model_text
+
+
+class CachedEncoder(object):
+    """
+    Wraps a SentenceTransformer: names are looked up by the text the model
+    sees (to_model_text) in the in-memory cache, then in the optional persistent store, and only
+    the unique misses of a call go through model.encode, in one batched call.
+
+    With a MicroBatcher attached, calls with only a few misses (typically a
+    single /predict) are coalesced with concurrent calls of other requests.
+
+    With a token_budget, the misses are sorted by token length and batched
+    by padded tokens (see batching.py); an explicit batch_size then caps
+    the number of names per batch.
+
+    With a projection (see projection.py) every embedding is projected right
+    after the model, so caches and everything downstream hold the smaller
+    vectors. With a precision other than float32 the in-memory cache holds
+    the vectors packed as bytes (see precision.py), the same format as a
+    store of that precision.
+    """
+
+    def __init__(self, model, cache, batch_size=64, store=None, batcher=None, token_budget=None,
+                 projection=None, precision='float32'):
+        self.model = model
+        self.cache = cache
+        self.batch_size = batch_size
+        self.store = store
+        self.batcher = batcher
+        self.token_budget = token_budget
+        self.projection = projection
+        self.precision = check_precision(precision)
+
+    @property
+    def dimension(self):
+        if self.projection is not None:
+            return self.projection.dimension
+        return self.model.get_sentence_embedding_dimension()
+
+    def _cache_put(self, key, embedding):
+        if self.precision == 'float32':
+            # copy, so a cached row does not keep the whole batch alive
+            embedding = np.array(embedding, dtype=np.float32)
+        else:
+            embedding = pack(embedding, self.precision)
+        self.cache.put(key, embedding)
+
+    def _cache_get(self, key):
+        embedding = self.cache.get(key)
+        if embedding is None or self.precision == 'float32':
+            return embedding
+        return unpack(embedding, self.precision)
+
+    def encode_uncached(self, texts, batch_size=None):
+        """Normalized float32 embeddings (n, d) straight from the model (and projection)"""
+        texts = [to_model_text(text) for text in texts]
+        with STAGE_SECONDS.time(stage='encode'):
+            if self.token_budget:
+                embeddings = encode_bucketed(self.model, texts, self.token_budget, batch_size,
+                                             normalize_embeddings=True)
+            else:
+                ENCODE_BATCH_SIZE.observe(len(texts))
+                embeddings = self.model.encode(
+                    texts,
+                    batch_size=batch_size or self.batch_size,
+                    convert_to_numpy=True,
+                    normalize_embeddings=True
+                )
+        embeddings = np.asarray(embeddings, dtype=np.float32)
+        if self.projection is not None:
+            embeddings = self.projection.transform(embeddings)
+        return embeddings
+
+    def encode(self, texts, batch_size=None):
+        """Normalized float32 embeddings (n, d) in the order of texts"""
+        if not texts:
+            return np.empty((0, self.dimension), dtype=np.float32)
+        # not normalize_name: the model embeds "büro" and "buro" differently
+        keys = [to_model_text(text) for text in texts]
+        found = {}
+        missing = {}
+        with STAGE_SECONDS.time(stage='cache_lookup'):
+            for key, text in zip(keys, texts):
+                if key in found or key in missing:
+                    continue
+                embedding = self._cache_get(key)
+                if embedding is None:
+                    missing[key] = text
+                else:
+                    found[key] = embedding
+
+        if missing and self.store is not None:
+            with STAGE_SECONDS.time(stage='store_lookup'):
+                for key, embedding in self.store.get_many(missing).items():
+                    self._cache_put(key, embedding)
+                    found[key] = embedding
+                    del missing[key]
+
+        if missing:
+            texts = list(missing.values())
+            if self.batcher is not None and len(texts) < self.batcher.max_batch_size:
+                embeddings = self.batcher.encode(texts)
+            else:
+                embeddings = self.encode_uncached(texts, batch_size)
+            for key, embedding in zip(missing, embeddings):
+                self._cache_put(key, embedding)
+                found[key] = embedding
+            if self.store is not None:
+                self.store.put_many((key, found[key]) for key in missing)
+
+        return np.stack([found[key] for key in keys])
@@ -0,0 +1,126 @@
+"""
+Accuracy and speed measurements shared by benchmarks/run_suite.py and the
+notebooks. Nothing here materializes an n x n similarity matrix.
+"""
+
+import random
+import time
+from collections import defaultdict
+
+import numpy as np
+
+
+def stratified_split(labels, test_fraction=0.2, seed=42):
+    """Train and test row indices with every class represented in both where possible"""
+    rng = random.Random(seed)
+    by_class = defaultdict(list)
+    for index, label in enumerate(labels):
+        by_class[label].append(index)
+    train, test = [], []
+    for label in sorted(by_class):
+        rows = by_class[label]
+        rng.shuffle(rows)
+        count = int(round(len(rows) * test_fraction))
+        if len(rows) > 1:
+            count = min(max(count, 1), len(rows) - 1)
+        test.extend(rows[:count])
+        train.extend(rows[count:])
+    return sorted(train), sorted(test)
+
+
+def class_means(embeddings, labels):
+    """Labels and (classes, d) matrix of the mean embedding per class"""
+    labels = np.asarray(labels)
+    classes = sorted(set(labels.tolist()))
+    return classes, np.stack([np.asarray(embeddings)[labels == label].mean(axis=0) for label in classes])
+
+
+def classification_report(similarities, class_labels, true_labels, top_k=3):
+    """
+    Top-1 / top-k accuracy, per class precision and recall, and the
+    confusion counts {true: {predicted: count}} of a (n, classes) score matrix.
+    """
+    class_labels = np.asarray(class_labels)
+    true_labels = np.asarray(true_labels)
+    ranking = np.argsort(-similarities, axis=1)
+    predicted = class_labels[ranking[:, 0]]
+    in_top_k = (class_labels[ranking[:, :top_k]] == true_labels[:, None]).any(axis=1)
+
+    confusion = {str(label): defaultdict(int) for label in class_labels}
+    for true, pred in zip(true_labels.tolist(), predicted.tolist()):
+        confusion.setdefault(str(true), defaultdict(int))[str(pred)] += 1
+
+    per_class = {}
+    for label in class_labels.tolist():
+        support = int((true_labels == label).sum())
+        predicted_count = int((predicted == label).sum())
+        correct = int(((true_labels == label) & (predicted == label)).sum())
+        per_class[str(label)] = {
+            "support": support,
+            "precision": round(correct / predicted_count, 4) if predicted_count else 0.0,
+            "recall": round(correct / support, 4) if support else 0.0
+        }
+
+    return {
+        "top1_accuracy": round(float((predicted == true_labels).mean()), 4),
+        f"top{top_k}_accuracy": round(float(in_top_k.mean()), 4),
+        "per_class": per_class,
+        "confusion": {true: dict(row) for true, row in confusion.items()}
+    }
+
+
+def similarity_statistics(embeddings, labels, block_size=256):
+    """
+    Mean cosine similarity within each class and between classes, as the
+    data_preparation.ipynb cell computes it, accumulated block by block:
+    every block of rows is multiplied with all rows and summed per class.
+    """
+    embeddings = np.asarray(embeddings, dtype=np.float32)
+    embeddings = embeddings / np.maximum(np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-12)
+    labels = np.asarray(labels)
+    classes = sorted(set(labels.tolist()))
+    class_index = np.array([classes.index(label) for label in labels.tolist()])
+    one_hot = np.zeros((len(labels), len(classes)), dtype=np.float32)
+    one_hot[np.arange(len(labels)), class_index] = 1.0
+
+    # pair_sums[a, b] = sum of similarities of rows of class a with rows of class b
+    pair_sums = np.zeros((len(classes), len(classes)), dtype=np.float64)
+    for start in range(0, len(labels), block_size):
+        block = embeddings[start:start + block_size] @ embeddings.T
+        pair_sums += one_hot[start:start + block_size].T @ (block @ one_hot)
+
+    sizes = one_hot.sum(axis=0).astype(np.float64)
+    pair_counts = np.outer(sizes, sizes)
+    intra = {label: float(pair_sums[i, i] / pair_counts[i, i]) for i, label in enumerate(classes)}
+    off_diagonal = ~np.eye(len(classes), dtype=bool)
+    inter_mean = float(pair_sums[off_diagonal].sum() / pair_counts[off_diagonal].sum())
+    return {
+        "intra_class_mean": {label: round(value, 4) for label, value in intra.items()},
+        "inter_class_mean": round(inter_mean, 4),
+        "separation": round(float(np.mean(list(intra.values()))) - inter_mean, 4)
+    }
+
+
+def latency_profile(encode, texts, batch_sizes=(1, 8, 32, 128), max_names=512):
+    """
+    Encode throughput and per-call latency percentiles for several batch
+    sizes; encode(list_of_texts) is called with one batch at a time.
+    """
+    texts = list(texts)[:max_names]
+    profile = []
+    for batch_size in batch_sizes:
+        latencies = []
+        start = time.perf_counter()
+        for offset in range(0, len(texts), batch_size):
+            call_start = time.perf_counter()
+            encode(texts[offset:offset + batch_size])
+            latencies.append(time.perf_counter() - call_start)
+        elapsed = time.perf_counter() - start
+        latencies.sort()
+        profile.append({
+            "batch_size": batch_size,
+            "names_per_second": round(len(texts) / elapsed, 1),
+            "p50_ms": round(latencies[len(latencies) // 2] * 1e3, 3),
+            "p99_ms": round(latencies[min(len(latencies) - 1, int(0.99 * len(latencies)))] * 1e3, 3)
+        })
+    return profile
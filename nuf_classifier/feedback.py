@@ -0,0 +1,140 @@
+"""
+Confirmed (room name, NUF) pairs from the pyRevit buttons, used to adapt the
+class prototypes to the office vocabulary without rerunning the training
+notebook.
+
+Every prototype is treated as a running mean: a class that currently stands
+for `count` examples moves towards a new example by weight / (count + weight),
+so one confirmation costs one vector update instead of re-encoding the data.
+
+The SQLite file is the only record of the confirmations. The prototype file
+is never rewritten: every process replays the confirmations on top of it in
+the order they were stored, so all workers (and restarts) arrive at the
+same prototypes. Confirmations belong to the model version they were sent
+to, every version only replays its own.
+"""
+
+import threading
+import time
+
+from .connection import ProcessConnection
+from .text import normalize_name, to_model_text
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS confirmations (
+    version TEXT NOT NULL,
+    name TEXT NOT NULL,
+    nuf TEXT NOT NULL,
+    text TEXT NOT NULL,
+    weight REAL NOT NULL,
+    created_at REAL NOT NULL,
+    PRIMARY KEY (version, name, nuf)
+)
+"""
+
+
+class FeedbackStore(object):
+    """
+    SQLite log of confirmed classifications, one row per model version,
+    normalized name and class. The connection is opened in the process that
+    uses it, see connection.py.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._connection = ProcessConnection(path, _SCHEMA)
+
+    def __len__(self):
+        with self._connection.lock:
+            return self._connection.get().execute('SELECT COUNT(*) FROM confirmations').fetchone()[0]
+
+    def add(self, version, name, nuf, weight=1.0):
+        """
+        Records a confirmed pair, returns False if the same name was already
+        confirmed for this class and version (repeated clicks do not count twice).
+        """
+        with self._connection.lock:
+            connection = self._connection.get()
+            with connection:
+                return connection.execute(
+                    'INSERT OR IGNORE INTO confirmations '
+                    '(version, name, nuf, text, weight, created_at) VALUES (?, ?, ?, ?, ?, ?)',
+                    (version, normalize_name(name), nuf, to_model_text(name), float(weight),
+                     time.time())
+                ).rowcount == 1
+
+    def since(self, version, row_id=0):
+        """(row id, text, nuf, weight) of the confirmations of a version after row_id, oldest first"""
+        with self._connection.lock:
+            return self._connection.get().execute(
+                'SELECT rowid, text, nuf, weight FROM confirmations '
+                'WHERE version = ? AND rowid > ? ORDER BY rowid',
+                (version, row_id)
+            ).fetchall()
+
+    def close(self):
+        self._connection.close()
+
+
+class PrototypeUpdater(object):
+    """
+    Applies the confirmations of one model version in a FeedbackStore to its
+    PrototypeMatrix.
+
+    The count of a class starts at prior_counts[label] (e.g. the number of
+    catalogue entries of the class, default_count if missing). sync() embeds
+    the names confirmed since its last call with encode(texts) -> (n, d),
+    including those stored by other processes, and builds a new matrix;
+    readers holding the old matrix are never affected.
+    """
+
+    def __init__(self, version, prototypes, store, encode, prior_counts=None, default_count=1.0):
+        self.version = version
+        self.prototypes = prototypes
+        self.store = store
+        self.encode = encode
+        self._lock = threading.Lock()
+        self._last_row = 0
+        self._synced_at = 0.0
+        prior_counts = prior_counts or {}
+        self.counts = {
+            label: float(prior_counts.get(label, default_count))
+            for label in prototypes.labels.tolist()
+        }
+        self.sync()
+
+    def sync(self, max_age=None):
+        """
+        Applies the confirmations stored since the last sync and returns the
+        current prototypes. With max_age (seconds), the store is only read if
+        the last sync is older than that.
+        """
+        if max_age is not None and time.monotonic() - self._synced_at < max_age:
+            return self.prototypes
+        with self._lock:
+            rows = self.store.since(self.version, self._last_row)
+            if rows:
+                embeddings = self.encode([text for _, text, _, _ in rows])
+                prototypes = self.prototypes
+                for (_, _, nuf, weight), embedding in zip(rows, embeddings):
+                    # a class this prototype set does not have
+                    if nuf not in self.counts:
+                        continue
+                    count = self.counts[nuf]
+                    prototypes = prototypes.updated(nuf, embedding, weight / (count + weight))
+                    self.counts[nuf] = count + weight
+                self._last_row = rows[-1][0]
+                self.prototypes = prototypes
+            self._synced_at = time.monotonic()
+            return self.prototypes
+
+    def add(self, name, nuf, weight=1.0):
+        """
+        Stores a confirmed name and moves the prototype of nuf towards it.
+        Returns (prototypes, updated); updated is False for a repeated pair.
+        Raises KeyError for unknown classes.
+        """
+        if nuf not in self.counts:
+            raise KeyError(nuf)
+        updated = self.store.add(self.version, name, nuf, weight)
+        return self.sync(), updated
@@ -0,0 +1,80 @@
+"""Cheap fingerprints of model and prototype files used to invalidate caches."""
+
+import hashlib
+import os
+
+
+def _iter_files(path):
+    if os.path.isfile(path):
+        yield path
+        return
+    for directory, _, file_names in sorted(os.walk(path)):
+        for file_name in sorted(file_names):
+            yield os.path.join(directory, file_name)
+
+
+def path_fingerprint(*paths):
+    """
+    Hash of name, size and modification time of every file under the given
+    paths. Changes whenever a model directory or a prototype file is replaced.
+    Missing paths contribute their name only.
+    """
+    digest = hashlib.sha1()
+    for path in paths:
+        digest.update(os.path.abspath(path).encode('utf-8'))
+        if not os.path.exists(path):
+            continue
+        for file_path in _iter_files(path):
+            stat = os.stat(file_path)
+            digest.update(os.path.relpath(file_path, path).encode('utf-8'))
+            digest.update(str((stat.st_size, stat.st_mtime_ns)).encode('utf-8'))
+    return digest.hexdigest()[:16]
+
+
+WEIGHT_EXTENSIONS = ('.safetensors', '.bin', '.onnx', '.pt')
+
+# Subfolders with exports of the same weights for other backends, e.g. the
+# onnx/ folder backends.load_model saves on the first ONNX start
+EXPORT_FOLDERS = ('onnx', 'openvino')
+
+# Bytes read from the start and the end of each weight file
+_SAMPLE_SIZE = 4 * 1024 * 1024
+
+
+def _is_export(relative_path):
+    return relative_path.replace(os.sep, '/').split('/')[0] in EXPORT_FOLDERS
+
+
+def weights_fingerprint(model_path):
+    """
+    Content based fingerprint of the model weights. Unlike path_fingerprint
+    it survives copying the model to another machine. Only the size and the
+    first and last few MB of each weight file are hashed to keep startup fast.
+    Backend exports (EXPORT_FOLDERS) are only hashed for a model that has no
+    other weights, so saving an export does not change the fingerprint; the
+    backend is part of the store tag anyway. Without local weight files (a
+    hub model id, the stub backend) the model path or name itself is hashed,
+    so different models never share a fingerprint.
+    """
+    weight_files = [
+        file_path for file_path in _iter_files(model_path)
+        if file_path.endswith(WEIGHT_EXTENSIONS)
+    ]
+    if os.path.isdir(model_path):
+        own = [file_path for file_path in weight_files
+               if not _is_export(os.path.relpath(file_path, model_path))]
+        weight_files = own or weight_files
+
+    digest = hashlib.sha1()
+    for file_path in weight_files:
+        size = os.path.getsize(file_path)
+        digest.update(os.path.relpath(file_path, model_path).encode('utf-8'))
+        digest.update(str(size).encode('utf-8'))
+        with open(file_path, 'rb') as f:
+            digest.update(f.read(_SAMPLE_SIZE))
+            if size > 2 * _SAMPLE_SIZE:
+                f.seek(-_SAMPLE_SIZE, os.SEEK_END)
+                digest.update(f.read(_SAMPLE_SIZE))
+    if not weight_files:
+        digest.update(os.path.normpath(model_path).encode('utf-8'))
+    return digest.hexdigest()[:16]
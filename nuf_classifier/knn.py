@@ -0,0 +1,117 @@
+"""
+Nearest-neighbour classification against every entry of the NC catalogue
+instead of one mean vector per NUF class. Answers with the closest catalogue
+entries (NC code and Bezeichnung) and a similarity-weighted NUF vote.
+"""
+
+import numpy as np
+
+from .precision import check_precision, quantize, scores
+from .prototypes import _normalize_rows
+
+INDEX_TYPES = ('exact', 'approximate')
+
+
+class CatalogueIndex(object):
+    """
+    Normalized matrix of catalogue embeddings, row i belongs to entries[i],
+    stored as float32, float16 or int8 (see precision.py). Searches exactly
+    with one matrix product by default; index_type='approximate' uses an
+    HNSW graph (optional hnswlib package) for large custom catalogues.
+    """
+
+    def __init__(self, entries, embeddings, index_type='exact', precision='float32'):
+        if index_type not in INDEX_TYPES:
+            raise ValueError(f'Unknown index type {index_type!r}, expected one of {INDEX_TYPES}')
+        matrix = np.asarray(embeddings, dtype=np.float32)
+        if matrix.ndim != 2 or matrix.shape[0] != len(entries):
+            raise ValueError('Expected one embedding per catalogue entry')
+        self.entries = list(entries)
+        self.index_type = index_type
+        self.precision = check_precision(precision)
+        matrix = _normalize_rows(matrix)
+        self.matrix, self.scales = quantize(matrix, precision)
+        self.labels = np.asarray([entry['NUF'] for entry in self.entries])
+        # hnswlib keeps its own float32 copy of the vectors
+        self._graph = self._build_graph(matrix) if index_type == 'approximate' else None
+
+    @classmethod
+    def build(cls, entries, encoder, index_type='exact', precision='float32'):
+        """Embed the Bezeichnung of every entry once with a CachedEncoder"""
+        embeddings = encoder.encode([entry['Bezeichnung'] for entry in entries])
+        return cls(entries, embeddings, index_type=index_type, precision=precision)
+
+    def __len__(self):
+        return len(self.entries)
+
+    def _build_graph(self, matrix):
+        try:
+            import hnswlib
+        except ImportError:
+            raise ImportError('The approximate catalogue index requires the hnswlib package')
+        graph = hnswlib.Index(space='ip', dim=matrix.shape[1])
+        graph.init_index(max_elements=len(self), ef_construction=200, M=16)
+        graph.add_items(matrix, np.arange(len(self)))
+        graph.set_ef(64)
+        return graph
+
+    def search(self, embeddings, k=5):
+        """
+        Indices and cosine similarities of the k nearest entries per
+        embedding, best first, both of shape (n, k).
+        """
+        embeddings = _normalize_rows(np.atleast_2d(np.asarray(embeddings, dtype=np.float32)))
+        k = min(k, len(self))
+        if self._graph is not None:
+            indices, distances = self._graph.knn_query(embeddings, k=k)
+            return indices.astype(np.int64), 1.0 - distances
+
+        similarities = scores(embeddings, self.matrix, self.scales)
+        if k < len(self):
+            candidates = np.argpartition(-similarities, k - 1, axis=1)[:, :k]
+        else:
+            candidates = np.tile(np.arange(len(self)), (len(embeddings), 1))
+        candidate_scores = np.take_along_axis(similarities, candidates, axis=1)
+        order = np.argsort(-candidate_scores, axis=1)
+        return (np.take_along_axis(candidates, order, axis=1),
+                np.take_along_axis(candidate_scores, order, axis=1))
+
+    def build_result(self, input_text, indices, scores):
+        """
+        One k-NN prediction: the NUF with the highest sum of neighbour
+        similarities wins, confidence is its share of all positive votes.
+        """
+        votes = {}
+        neighbours = []
+        for index, score in zip(indices.tolist(), scores.tolist()):
+            entry = self.entries[index]
+            votes[entry['NUF']] = votes.get(entry['NUF'], 0.0) + max(score, 0.0)
+            neighbours.append({
+                "NC": entry['NC'],
+                "Bezeichnung": entry['Bezeichnung'],
+                "NUF": entry['NUF'],
+                "similarity": score
+            })
+
+        best_class = max(votes, key=votes.get)
+        sum_of_votes = sum(votes.values())
+        if sum_of_votes > 0:
+            confidence = (votes[best_class] / sum_of_votes) * 100
+        else:
+            confidence = 0.0
+
+        return {
+            "input_text": input_text,
+            "predicted_class": best_class,
+            "predicted_nc": neighbours[0]["NC"],
+            "confidence_percentage": round(confidence, 2),
+            "class_votes": votes,
+            "neighbours": neighbours
+        }
+
+    def classify(self, input_texts, embeddings, k=5):
+        indices, scores = self.search(embeddings, k)
+        return [
+            self.build_result(input_text, row_indices, row_scores)
+            for input_text, row_indices, row_scores in zip(input_texts, indices, scores)
+        ]
@@ -0,0 +1,144 @@
+"""
+Lexical fast path in front of the transformer: room names that match a
+catalogue Bezeichnung exactly (after normalization) or with a small typo
+are answered from data/NUF_data.csv without calling model.encode.
+"""
+
+import heapq
+import math
+from collections import Counter, defaultdict
+from itertools import chain
+
+from .cache import LRUCache
+from .text import normalize_name
+
+# Fuzzy candidates that share the most n-grams with the query, checked by edit distance
+_MAX_CANDIDATES = 20
+
+# 10 * (1 - 0.9) is 0.999..., which must still allow one edit
+_EPSILON = 1e-9
+
+
+def _ngrams(key, n):
+    padded = ' ' * (n - 1) + key + ' '
+    return {padded[i:i + n] for i in range(len(padded) - n + 1)}
+
+
+def edit_distance(a, b, max_distance=None):
+    """
+    Levenshtein distance of two strings. Stops early and returns
+    max_distance + 1 once the distance is known to exceed max_distance.
+    """
+    if len(a) < len(b):
+        a, b = b, a
+    if max_distance is not None and len(a) - len(b) > max_distance:
+        return max_distance + 1
+    previous = list(range(len(b) + 1))
+    for i, char_a in enumerate(a, 1):
+        current = [i]
+        for j, char_b in enumerate(b, 1):
+            current.append(min(
+                previous[j] + 1,
+                current[j - 1] + 1,
+                previous[j - 1] + (char_a != char_b)
+            ))
+        if max_distance is not None and min(current) > max_distance:
+            return max_distance + 1
+        previous = current
+    return previous[-1]
+
+
+class LexicalIndex(object):
+    """
+    Hash map from normalized Bezeichnung / bezeichnung_no_special_ch to
+    catalogue entries, plus an n-gram inverted index for typo matches.
+    Names whose matching entries disagree on the NUF are never answered.
+
+    Lookups are memoized per normalized name, misses included: a project
+    repeats the same few names, and a fuzzy miss scans the n-gram index.
+    """
+
+    def __init__(self, entries, min_similarity=0.9, ngram=3, cache_size=10000):
+        self.min_similarity = min_similarity
+        self.ngram = ngram
+        self._lookups = LRUCache(cache_size)
+        self._entries_by_key = defaultdict(list)
+        for entry in entries:
+            for column in ('Bezeichnung', 'bezeichnung_no_special_ch'):
+                if entry.get(column):
+                    key = normalize_name(entry[column])
+                    if entry not in self._entries_by_key[key]:
+                        self._entries_by_key[key].append(entry)
+
+        # keys whose entries all share one NUF class
+        self._keys = {
+            key: matches for key, matches in self._entries_by_key.items()
+            if len({entry['NUF'] for entry in matches}) == 1
+        }
+        self._keys_by_gram = defaultdict(set)
+        for key in self._keys:
+            for gram in _ngrams(key, ngram):
+                self._keys_by_gram[gram].add(key)
+
+    def __len__(self):
+        return len(self._keys)
+
+    def _fuzzy_candidates(self, key):
+        # counted by Counter in C, a Python loop over the postings dominated a miss
+        shared = Counter(chain.from_iterable(
+            self._keys_by_gram.get(gram, ()) for gram in _ngrams(key, self.ngram)))
+        return heapq.nlargest(_MAX_CANDIDATES, shared, key=shared.get)
+
+    def lookup(self, text):
+        """
+        Returns {"path": "exact" | "fuzzy", "key", "entry", "similarity"}
+        for a confident match, otherwise None.
+        """
+        key = normalize_name(text)
+        match = self._lookups.get(key)
+        if match is None:
+            match = self._lookup(key) or False
+            self._lookups.put(key, match)
+        return match or None
+
+    def _lookup(self, key):
+        if key in self._entries_by_key:
+            # an exact but ambiguous match is left to the model
+            if key not in self._keys:
+                return None
+            return {"path": "exact", "key": key, "entry": self._keys[key][0], "similarity": 1.0}
+
+        if self.min_similarity >= 1:
+            return None
+        best_key, best_similarity, best_classes = None, 0.0, set()
+        for candidate in self._fuzzy_candidates(key):
+            longest = max(len(key), len(candidate))
+            max_distance = int(math.floor(longest * (1 - self.min_similarity) + _EPSILON))
+            distance = edit_distance(key, candidate, max_distance)
+            if distance > max_distance:
+                continue
+            similarity = 1 - distance / float(longest)
+            nuf = self._keys[candidate][0]['NUF']
+            if similarity > best_similarity:
+                best_key, best_similarity, best_classes = candidate, similarity, {nuf}
+            elif similarity == best_similarity:
+                best_classes.add(nuf)
+
+        # equally close candidates of different classes are ambiguous
+        if best_key is None or len(best_classes) > 1:
+            return None
+        return {"path": "fuzzy", "key": best_key, "entry": self._keys[best_key][0],
+                "similarity": best_similarity}
+
+    def build_result(self, input_text, match):
+        """Lexical match in the response format of /predict"""
+        entry = match["entry"]
+        return {
+            "input_text": input_text,
+            "predicted_class": entry['NUF'],
+            "predicted_nc": entry['NC'],
+            "confidence_percentage": round(match["similarity"] * 100, 2),
+            "all_class_scores": {entry['NUF']: match["similarity"]},
+            "matched_entry": {"NC": entry['NC'], "Bezeichnung": entry['Bezeichnung']},
+            "path": match["path"]
+        }
@@ -0,0 +1,177 @@
+"""
+Minimal Prometheus-compatible metrics (counters, histograms and gauges read
+from callbacks) rendered in the text exposition format for /metrics.
+Metrics are registered on the module-level REGISTRY, like prometheus_client
+does, so every module can time its own stages.
+"""
+
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+
+# Seconds, from sub-millisecond lexical lookups up to large batch encodes
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (1, 2, 4, 8, 16, 32, 64, 128, 256, 512, 1024, 4096, 16384)
+RATIO_BUCKETS = (0.05, 0.1, 0.2, 0.3, 0.4, 0.5, 0.6, 0.7, 0.8, 0.9)
+
+
+def _format_labels(labelnames, values, extra=None):
+    pairs = list(zip(labelnames, values))
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join('{}="{}"'.format(name, str(value).replace('"', '\\"'))
+                          for name, value in pairs) + '}'
+
+
+def _format_value(value):
+    return repr(float(value)) if value != float('inf') else '+Inf'
+
+
+class Counter(object):
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(labels.get(name, '') for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels):
+        return self._values.get(tuple(labels.get(name, '') for name in self.labelnames), 0)
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} counter']
+        with self._lock:
+            for key, value in sorted(self._values.items()):
+                lines.append(f'{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}')
+        return lines
+
+
+class Histogram(object):
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(labels.get(name, '') for name in self.labelnames)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                # per-bucket counts (last one is +Inf), sum, count
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    @contextmanager
+    def time(self, **labels):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def render(self):
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} histogram']
+        with self._lock:
+            for key, (counts, total, count) in sorted(self._series.items()):
+                cumulative = 0
+                for bound, bucket_count in zip(self.buckets + (float('inf'),), counts):
+                    cumulative += bucket_count
+                    labels = _format_labels(self.labelnames, key, ('le', _format_value(bound)))
+                    lines.append(f'{self.name}_bucket{labels} {cumulative}')
+                labels = _format_labels(self.labelnames, key)
+                lines.append(f'{self.name}_sum{labels} {_format_value(total)}')
+                lines.append(f'{self.name}_count{labels} {count}')
+        return lines
+
+
+class CallbackGauge(object):
+    """Gauge or counter whose current value is read from a callback at render time"""
+
+    def __init__(self, name, documentation, callback, metric_type='gauge'):
+        self.name = name
+        self.documentation = documentation
+        self.callback = callback
+        self.metric_type = metric_type
+
+    def render(self):
+        value = self.callback()
+        if value is None:
+            return []
+        return [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.metric_type}',
+                f'{self.name} {_format_value(value)}']
+
+
+class MetricsRegistry(object):
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        """Adds a metric, or returns the already registered one of that name"""
+        with self._lock:
+            return self._metrics.setdefault(metric.name, metric)
+
+    def counter(self, name, documentation, labelnames=()):
+        return self.register(Counter(name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        return self.register(Histogram(name, documentation, labelnames, buckets))
+
+    def callback(self, name, documentation, callback, metric_type='gauge'):
+        """Registers (or replaces) a value read from callback() at render time"""
+        with self._lock:
+            self._metrics[name] = CallbackGauge(name, documentation, callback, metric_type)
+
+    def render(self):
+        """All metrics in the Prometheus text exposition format"""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return '\n'.join(lines) + '\n'
+
+
+REGISTRY = MetricsRegistry()
+
+STAGE_SECONDS = REGISTRY.histogram(
+    'nuf_stage_seconds',
+    'Time spent per prediction stage (encode includes tokenize)',
+    ('stage',)
+)
+ENCODE_BATCH_SIZE = REGISTRY.histogram(
+    'nuf_encode_batch_size', 'Names per model.encode call', buckets=SIZE_BUCKETS)
+ENCODE_PADDING_RATIO = REGISTRY.histogram(
+    'nuf_encode_padding_ratio', 'Share of padding tokens per encoded batch', buckets=RATIO_BUCKETS)
+
+
+def instrument_tokenizer(model):
+    """
+    Times the tokenization inside model.encode as stage "tokenize" by
+    wrapping the model's tokenize method on the instance.
+    """
+    tokenize = getattr(model, 'tokenize', None)
+    if tokenize is None or getattr(tokenize, '_nuf_timed', False):
+        return model
+
+    def timed_tokenize(*args, **kwargs):
+        with STAGE_SECONDS.time(stage='tokenize'):
+            return tokenize(*args, **kwargs)
+
+    timed_tokenize._nuf_timed = True
+    model.tokenize = timed_tokenize
+    return model
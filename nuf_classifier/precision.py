@@ -0,0 +1,76 @@
+"""
+Compact storage of embedding vectors as float16 or int8 instead of float32.
+
+int8 vectors are quantized symmetrically per row: row i is stored as
+round(row / scales[i] * 127) with scales[i] = max(|row|), so a dot product
+with a float32 query is (query @ values.T) * scales / 127. Single vectors
+(cache entries, store rows) are packed into bytes, for int8 the float32
+scale followed by the values.
+"""
+
+import numpy as np
+
+PRECISIONS = ('float32', 'float16', 'int8')
+
+# Rows of a compact matrix converted to float32 at once while scoring
+_SCORE_CHUNK = 4096
+
+
+def check_precision(precision):
+    if precision not in PRECISIONS:
+        raise ValueError(f'Unknown precision {precision!r}, expected one of {PRECISIONS}')
+    return precision
+
+
+def quantize(matrix, precision):
+    """(values, scales) of a (n, d) matrix; scales is None unless precision is int8"""
+    check_precision(precision)
+    matrix = np.asarray(matrix, dtype=np.float32)
+    if precision != 'int8':
+        return np.ascontiguousarray(matrix.astype(precision)), None
+    scales = np.abs(matrix).max(axis=1) / 127.0
+    scales[scales == 0] = 1.0
+    values = np.clip(np.rint(matrix / scales[:, None]), -127, 127).astype(np.int8)
+    return np.ascontiguousarray(values), scales.astype(np.float32)
+
+
+def dequantize(values, scales=None):
+    """float32 matrix of quantize() output"""
+    matrix = np.asarray(values, dtype=np.float32)
+    if scales is not None:
+        matrix = matrix * np.asarray(scales, dtype=np.float32)[:, None]
+    return matrix
+
+
+def scores(embeddings, values, scales=None):
+    """
+    embeddings (n, d) float32 times the transposed compact matrix, (n, rows).
+    Large matrices are converted in chunks of rows, so scoring never holds
+    a full float32 copy of them.
+    """
+    if values.dtype == np.float32:
+        return embeddings @ values.T
+    result = np.empty((len(embeddings), len(values)), dtype=np.float32)
+    for start in range(0, len(values), _SCORE_CHUNK):
+        chunk = values[start:start + _SCORE_CHUNK]
+        result[:, start:start + len(chunk)] = embeddings @ chunk.T.astype(np.float32)
+    if scales is not None:
+        result *= scales
+    return result
+
+
+def pack(vector, precision):
+    """Bytes of one vector in the given precision, see unpack()"""
+    values, scales = quantize(np.asarray(vector).reshape(1, -1), precision)
+    if scales is None:
+        return values.tobytes()
+    return scales.tobytes() + values.tobytes()
+
+
+def unpack(blob, precision):
+    """float32 vector of pack() output"""
+    check_precision(precision)
+    if precision != 'int8':
+        return np.frombuffer(blob, dtype=precision).astype(np.float32, copy=False)
+    scale = np.frombuffer(blob, dtype=np.float32, count=1)
+    return np.frombuffer(blob, dtype=np.int8, offset=4).astype(np.float32) * scale
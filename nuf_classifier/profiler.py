@@ -0,0 +1,81 @@
+"""
+Sampling profiler that can be switched on and off in a running server.
+A background thread records the Python stack of every other thread at a
+fixed interval; the result is returned in the collapsed-stack format read
+by flamegraph.pl and speedscope.
+"""
+
+import os
+import sys
+import threading
+from collections import Counter
+
+
+class SamplingProfiler(object):
+    def __init__(self, interval_ms=10.0, max_depth=64):
+        self.interval = interval_ms / 1000.0
+        self.max_depth = max_depth
+        self.samples = 0
+        self._stacks = Counter()
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    @property
+    def running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self, interval_ms=None, reset=True):
+        if interval_ms:
+            self.interval = interval_ms / 1000.0
+        if self.running:
+            return
+        if reset:
+            self.reset()
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='nuf-profiler', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+    def reset(self):
+        with self._lock:
+            self._stacks.clear()
+            self.samples = 0
+
+    def _run(self):
+        own_id = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            frames = sys._current_frames()
+            with self._lock:
+                for thread_id, frame in frames.items():
+                    if thread_id == own_id:
+                        continue
+                    self._stacks[self._collapse(frame)] += 1
+                self.samples += 1
+
+    def _collapse(self, frame):
+        names = []
+        while frame is not None and len(names) < self.max_depth:
+            code = frame.f_code
+            names.append(f'{os.path.basename(code.co_filename)}:{code.co_name}')
+            frame = frame.f_back
+        return ';'.join(reversed(names))
+
+    def collapsed(self, limit=None):
+        """Collapsed stacks "a;b;c count", most frequent first"""
+        with self._lock:
+            stacks = self._stacks.most_common(limit)
+        return '\n'.join(f'{stack} {count}' for stack, count in stacks) + '\n'
+
+    def stats(self):
+        return {
+            "running": self.running,
+            "interval_ms": self.interval * 1000,
+            "samples": self.samples,
+            "distinct_stacks": len(self._stacks)
+        }
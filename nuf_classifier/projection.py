@@ -0,0 +1,117 @@
+"""
+Optional PCA projection of the 768-dimensional sentence embeddings to a few
+dozen dimensions, fitted on the embeddings of the catalogue. Prototypes,
+cached embeddings and the k-NN index then hold the projected vectors,
+which together with float16 / int8 storage (precision.py) cuts their
+memory by up to 24x.
+
+    python -m nuf_classifier.projection projection_128.npz --dimension 128
+
+benchmarks/bench_projection.py reports the accuracy of every dimension and
+precision, pick the smallest one that keeps the top-1 NUF of the full
+embeddings.
+"""
+
+import argparse
+import hashlib
+import os
+
+import numpy as np
+
+from .prototypes import _atomic_write, _normalize_rows
+
+
+class Projection(object):
+    """
+    Centering and projection onto the first principal components:
+    transform(x) = normalize((x - mean) @ components.T), components (k, d).
+    """
+
+    def __init__(self, mean, components, explained_variance=None):
+        self.mean = np.asarray(mean, dtype=np.float32)
+        self.components = np.ascontiguousarray(components, dtype=np.float32)
+        if self.components.ndim != 2 or self.components.shape[1] != self.mean.shape[0]:
+            raise ValueError('Expected components of shape (dimension, input dimension)')
+        self.explained_variance = (None if explained_variance is None
+                                   else np.asarray(explained_variance, dtype=np.float32))
+
+    @classmethod
+    def fit(cls, embeddings, dimension):
+        """PCA of (n, d) embeddings, keeping the first dimension components"""
+        embeddings = np.asarray(embeddings, dtype=np.float64)
+        if not 0 < dimension <= min(embeddings.shape):
+            raise ValueError(f'Dimension must be between 1 and {min(embeddings.shape)}')
+        mean = embeddings.mean(axis=0)
+        _, singular_values, components = np.linalg.svd(embeddings - mean, full_matrices=False)
+        variance = singular_values ** 2
+        return cls(mean, components[:dimension], variance[:dimension] / variance.sum())
+
+    @property
+    def dimension(self):
+        return self.components.shape[0]
+
+    @property
+    def input_dimension(self):
+        return self.components.shape[1]
+
+    def fingerprint(self):
+        """Hash of the projection, part of the tags of caches holding projected vectors"""
+        digest = hashlib.sha1(self.mean.tobytes())
+        digest.update(self.components.tobytes())
+        return digest.hexdigest()[:16]
+
+    def transform(self, embeddings):
+        """L2-normalized float32 projections (n, dimension) of embeddings (n, d)"""
+        embeddings = np.atleast_2d(np.asarray(embeddings, dtype=np.float32))
+        return _normalize_rows((embeddings - self.mean) @ self.components.T)
+
+    def save(self, path):
+        arrays = {'mean': self.mean, 'components': self.components}
+        if self.explained_variance is not None:
+            arrays['explained_variance'] = self.explained_variance
+        with _atomic_write(path, 'wb') as f:
+            np.savez(f, **arrays)
+
+    @classmethod
+    def load(cls, path):
+        with np.load(path) as arrays:
+            return cls(arrays['mean'], arrays['components'], arrays.get('explained_variance'))
+
+
+def catalogue_texts(entries):
+    """Bezeichnung and concat_text of every catalogue row, the texts a projection is fitted on"""
+    texts = []
+    for entry in entries:
+        texts.append(entry['Bezeichnung'])
+        if entry.get('concat_text'):
+            texts.append(entry['concat_text'])
+    return texts
+
+
+def main():
+    from .backends import BACKENDS, load_model
+    from .batching import encode_bucketed
+    from .catalogue import CATALOGUE_PATH, load_catalogue
+    from .text import to_model_text
+
+    parser = argparse.ArgumentParser(
+        description='Fit a PCA projection of the embeddings on the NC catalogue')
+    parser.add_argument('output', help='.npz file, used through NUF_PROJECTION')
+    parser.add_argument('--dimension', type=int, default=128)
+    parser.add_argument('--model', default='./fine_tuned_model_for_NUF_clustering_v5')
+    parser.add_argument('--backend', choices=BACKENDS, default='torch')
+    parser.add_argument('--catalogue', default=CATALOGUE_PATH)
+    args = parser.parse_args()
+
+    model = load_model(args.model, args.backend, device='cpu')
+    texts = [to_model_text(text) for text in catalogue_texts(load_catalogue(args.catalogue))]
+    embeddings = encode_bucketed(model, texts, normalize_embeddings=True)
+    projection = Projection.fit(embeddings, args.dimension)
+    projection.save(args.output)
+    print(f'Wrote a {projection.input_dimension} -> {projection.dimension} projection '
+          f'({float(projection.explained_variance.sum()):.1%} of the variance) to '
+          f'{os.path.abspath(args.output)}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,232 @@
+"""
+Class prototypes (one mean embedding per NUF class) stored as a single
+L2-normalized float32 matrix with a parallel label array, so that scoring
+a batch of room names is one matrix product instead of a loop over classes.
+
+Besides class_embeddings.json the matrix can be stored as a raw float32 or
+float16 .npy file with a JSON label sidecar, which loads without parsing
+and can be memory-mapped:
+
+    python -m nuf_classifier.prototypes class_embeddings.json class_embeddings.npy
+
+In memory the matrix can also be kept in a compact precision (compressed())
+or in the space of a PCA projection (projected(), see projection.py).
+"""
+
+import argparse
+import json
+import os
+import tempfile
+from contextlib import contextmanager
+
+import numpy as np
+
+from .precision import dequantize, quantize, scores
+
+
+def labels_path(path):
+    """Label sidecar of a prototype .npy file"""
+    return os.path.splitext(path)[0] + '.labels.json'
+
+
+def _normalize_rows(matrix):
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+@contextmanager
+def _atomic_write(path, mode):
+    """File object of a temporary file that replaces path once it is closed"""
+    directory = os.path.dirname(os.path.abspath(path))
+    handle, temporary_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    try:
+        with os.fdopen(handle, mode) as f:
+            yield f
+        os.replace(temporary_path, path)
+    except BaseException:
+        os.remove(temporary_path)
+        raise
+
+
+class PrototypeMatrix(object):
+    """Prototype vectors of all classes, row i belongs to labels[i]"""
+
+    def __init__(self, labels, vectors, normalized=False, scales=None):
+        """
+        normalized=True takes already L2-normalized vectors as they are,
+        e.g. a memory-mapped float16 matrix, without copying them.
+        scales holds the row scales of an int8 matrix, see precision.py.
+        """
+        matrix = np.asarray(vectors)
+        if matrix.ndim != 2 or matrix.shape[0] != len(labels):
+            raise ValueError('Expected one prototype vector per label')
+        if not normalized:
+            matrix = _normalize_rows(matrix.astype(np.float32))
+        self.labels = np.asarray(labels)
+        self.matrix = np.ascontiguousarray(matrix)
+        self.scales = scales
+        self._label_list = [str(label) for label in labels]
+
+    @classmethod
+    def from_dict(cls, class_embeddings):
+        """Build from a {label: vector} mapping as stored in class_embeddings.json"""
+        labels = list(class_embeddings)
+        return cls(labels, [class_embeddings[label] for label in labels])
+
+    @classmethod
+    def load_json(cls, path):
+        with open(path, 'r') as f:
+            return cls.from_dict(json.load(f))
+
+    @classmethod
+    def load_npy(cls, path, mmap=True):
+        """Load a matrix written by save_npy, memory-mapped by default"""
+        with open(labels_path(path), 'r') as f:
+            sidecar = json.load(f)
+        matrix = np.load(path, mmap_mode='r' if mmap else None)
+        return cls(sidecar['labels'], matrix, normalized=sidecar.get('normalized', False))
+
+    @classmethod
+    def load(cls, path, mmap=True):
+        """
+        Load prototypes by file extension. A missing .npy file falls back
+        to the .json file of the same name.
+        """
+        if path.endswith('.npy'):
+            if os.path.exists(path):
+                return cls.load_npy(path, mmap=mmap)
+            path = path[:-len('.npy')] + '.json'
+        return cls.load_json(path)
+
+    def save_npy(self, path, dtype='float32'):
+        """
+        Write the normalized matrix as .npy plus a <name>.labels.json sidecar.
+        Both files are written to a temporary file first and then replaced,
+        so a running service never reads a half-written file.
+        """
+        with _atomic_write(path, 'wb') as f:
+            np.save(f, self.dense().astype(dtype))
+        with _atomic_write(labels_path(path), 'w') as f:
+            json.dump({'labels': self._label_list, 'normalized': True, 'dtype': dtype}, f)
+
+    def save_json(self, path):
+        """Write the normalized prototypes as {label: vector}, like class_embeddings.json"""
+        with _atomic_write(path, 'w') as f:
+            json.dump(dict(zip(self._label_list, self.dense().astype(np.float64).tolist())), f)
+
+    def save(self, path, dtype='float32'):
+        """Write as .npy or .json by file extension"""
+        if path.endswith('.npy'):
+            self.save_npy(path, dtype)
+        else:
+            self.save_json(path)
+
+    def updated(self, label, embedding, rate):
+        """
+        Copy with the prototype of label moved towards embedding by rate
+        (0..1), the running mean step rate = weight / (count + weight).
+        """
+        index = self._label_list.index(label)
+        embedding = _normalize_rows(np.asarray(embedding, dtype=np.float32).reshape(1, -1))[0]
+        matrix = np.array(self.dense(), dtype=np.float32)
+        matrix[index] = (1.0 - rate) * matrix[index] + rate * embedding
+        matrix[index:index + 1] = _normalize_rows(matrix[index:index + 1])
+        return PrototypeMatrix(self._label_list, matrix, normalized=True).compressed(self.precision)
+
+    @property
+    def precision(self):
+        return 'int8' if self.scales is not None else str(self.matrix.dtype)
+
+    def dense(self):
+        """The normalized prototypes as a float32 matrix (a view if they are float32)"""
+        return dequantize(self.matrix, self.scales)
+
+    def compressed(self, precision):
+        """Copy stored as float32, float16 or int8 (see precision.py)"""
+        if precision == self.precision:
+            return self
+        values, scales = quantize(self.dense(), precision)
+        return PrototypeMatrix(self._label_list, values, normalized=True, scales=scales)
+
+    def projected(self, projection):
+        """Copy in the space of a projection.Projection, in the same precision"""
+        return PrototypeMatrix(self._label_list, projection.transform(self.dense())).compressed(
+            self.precision)
+
+    def __len__(self):
+        return len(self._label_list)
+
+    @property
+    def dimension(self):
+        return self.matrix.shape[1]
+
+    def similarities(self, embeddings):
+        """
+        Cosine similarity of every embedding with every prototype.
+        Accepts a single vector (d,) or a batch (n, d), returns (n, classes).
+        """
+        embeddings = np.atleast_2d(np.asarray(embeddings, dtype=np.float32))
+        return scores(_normalize_rows(embeddings), self.matrix, self.scales)
+
+    def top_k(self, similarities, k):
+        """Indices of the k best classes per row, best first"""
+        k = min(k, len(self))
+        if k == len(self):
+            return np.argsort(-similarities, axis=1)
+        candidates = np.argpartition(-similarities, k - 1, axis=1)[:, :k]
+        order = np.take_along_axis(similarities, candidates, axis=1).argsort(axis=1)[:, ::-1]
+        return np.take_along_axis(candidates, order, axis=1)
+
+    def build_result(self, input_text, scores, top_k=None):
+        """
+        Turns one row of similarities into the response format of /predict.
+        Confidence is the best score relative to the sum of all scores.
+        With top_k, "all_class_scores" only holds the top_k best classes,
+        best first.
+        """
+        best_index = int(np.argmax(scores))
+        best_class = self._label_list[best_index]
+        sum_of_scores = float(scores.sum())
+
+        if sum_of_scores > 0:
+            confidence = (float(scores[best_index]) / sum_of_scores) * 100
+        else:
+            confidence = 0.0
+
+        if top_k is None:
+            class_scores = dict(zip(self._label_list, scores.tolist()))
+        else:
+            best = self.top_k(scores[np.newaxis], top_k)[0]
+            class_scores = {self._label_list[index]: float(scores[index]) for index in best}
+
+        return {
+            "input_text": input_text,
+            "predicted_class": best_class,
+            "confidence_percentage": round(confidence, 2),
+            "all_class_scores": class_scores
+        }
+
+    def classify(self, input_texts, embeddings, top_k=None):
+        """Scores a batch of embeddings and returns one result per input text"""
+        similarities = self.similarities(embeddings)
+        return [
+            self.build_result(input_text, scores, top_k)
+            for input_text, scores in zip(input_texts, similarities)
+        ]
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Export class prototypes to a memory-mappable .npy file')
+    parser.add_argument('source', help='class_embeddings.json or another prototype file')
+    parser.add_argument('target', help='output .npy path, labels go to <name>.labels.json')
+    parser.add_argument('--dtype', choices=['float32', 'float16'], default='float32')
+    args = parser.parse_args()
+
+    prototypes = PrototypeMatrix.load(args.source)
+    prototypes.save_npy(args.target, dtype=args.dtype)
+    print(f'Wrote {len(prototypes)} prototypes ({args.dtype}) to {args.target}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,191 @@
+"""
+Registry of loaded model versions, so a retrained model can be rolled out
+without restarting the service.
+
+A new version is loaded in the background next to the active one, checked
+on a smoke set of labelled catalogue names and only then made active by
+swapping one reference. Requests take a version once at their start, so
+requests in flight finish on the version they started with. Older versions
+stay loaded for pinned requests until they are unloaded.
+"""
+
+import logging
+import threading
+import time
+
+import numpy as np
+
+from .startup import Startup
+
+logger = logging.getLogger(__name__)
+
+
+def smoke_set(entries, count=200, seed=0):
+    """(names, expected NUF labels) of up to count catalogue rows, spread over all classes"""
+    by_class = {}
+    for entry in entries:
+        by_class.setdefault(entry['NUF'], []).append(entry)
+    rng = np.random.default_rng(seed)
+    per_class = max(1, count // max(len(by_class), 1))
+    selected = []
+    for label in sorted(by_class):
+        rows = by_class[label]
+        for index in rng.permutation(len(rows))[:per_class]:
+            selected.append(rows[index])
+    return [entry['Bezeichnung'] for entry in selected], [entry['NUF'] for entry in selected]
+
+
+class ModelVersion(object):
+    """
+    Everything that depends on one model: the model behind its encoder
+    (with its own embedding cache), the class prototypes, the k-NN index
+    and the feedback updater. Set up by the build function of the registry.
+    A projection is fitted for one model, so it belongs to the version too.
+    """
+
+    def __init__(self, name, model_path, prototypes_path, projection_path=None):
+        self.name = name
+        self.model_path = model_path
+        self.prototypes_path = prototypes_path
+        self.projection_path = projection_path or None
+        self.encoder = None
+        self.prototypes = None
+        self.catalogue_index = None
+        self.prototype_updater = None
+        self.smoke_accuracy = None
+        self.loaded_at = None
+        self.load_seconds = None
+
+    def close(self):
+        if self.encoder is not None:
+            if self.encoder.batcher is not None:
+                self.encoder.batcher.close()
+            if self.encoder.store is not None:
+                self.encoder.store.close()
+
+    def describe(self):
+        return {
+            "model_path": self.model_path,
+            "prototypes_path": self.prototypes_path,
+            "projection_path": self.projection_path,
+            "dimension": self.prototypes.dimension if self.prototypes is not None else None,
+            "precision": self.prototypes.precision if self.prototypes is not None else None,
+            "smoke_accuracy": self.smoke_accuracy,
+            "loaded_at": self.loaded_at,
+            "load_seconds": self.load_seconds
+        }
+
+
+class ModelRegistry(object):
+    """
+    build(startup, version) fills a ModelVersion, timing its steps with
+    startup.step(). A version whose smoke set accuracy is below
+    min_accuracy is rejected, except for the first one, which the service
+    can not run without.
+    """
+
+    def __init__(self, build, smoke_texts=(), smoke_labels=(), min_accuracy=0.0):
+        self.build = build
+        self.smoke_texts = list(smoke_texts)
+        self.smoke_labels = np.asarray(smoke_labels)
+        self.min_accuracy = min_accuracy
+        self._versions = {}
+        self._loading = {}
+        self._failed = {}
+        self._active = None
+        self._lock = threading.Lock()
+
+    @property
+    def active_name(self):
+        return self._active
+
+    def get(self, name=None):
+        """The active version, or a loaded version by name; raises KeyError"""
+        name = self._active if name is None else name
+        version = self._versions.get(name) if name is not None else None
+        if version is None:
+            raise KeyError(name)
+        return version
+
+    def names(self):
+        return list(self._versions)
+
+    def load(self, name, model_path, prototypes_path, activate=True, startup=None,
+             projection_path=None):
+        """
+        Loads a version next to the current ones and, if it passes the smoke
+        set, registers it (and makes it active). With a startup tracker the
+        steps are recorded on it in the calling thread, otherwise the version
+        is loaded in a background thread; returns the tracker.
+        """
+        with self._lock:
+            if name in self._versions or name in self._loading:
+                raise ValueError(f'Model version {name!r} is already loaded or loading')
+            background = startup is None
+            startup = startup or Startup()
+            self._loading[name] = startup
+            self._failed.pop(name, None)
+        version = ModelVersion(name, model_path, prototypes_path, projection_path)
+        if background:
+            startup.run(lambda startup: self._load(startup, version, activate))
+        else:
+            self._load(startup, version, activate)
+        return startup
+
+    def _load(self, startup, version, activate):
+        started = time.perf_counter()
+        try:
+            self.build(startup, version)
+            if self.smoke_texts:
+                with startup.step('smoke_test'):
+                    version.smoke_accuracy = self.validate(version)
+                if version.smoke_accuracy < self.min_accuracy:
+                    message = (f'Smoke set accuracy {version.smoke_accuracy:.3f} of {version.name!r} '
+                               f'is below {self.min_accuracy:.3f}')
+                    if self._active is not None:
+                        version.close()
+                        raise ValueError(message)
+                    logger.warning('%s, using it anyway as the only version', message)
+        except Exception:
+            with self._lock:
+                self._loading.pop(version.name, None)
+                self._failed[version.name] = startup
+            raise
+        version.loaded_at = time.time()
+        version.load_seconds = round(time.perf_counter() - started, 3)
+        with self._lock:
+            self._versions[version.name] = version
+            self._loading.pop(version.name, None)
+            if activate or self._active is None:
+                self._active = version.name
+        logger.info('Model version %r loaded%s', version.name,
+                    ' and active' if self._active == version.name else '')
+
+    def validate(self, version):
+        """Share of smoke set names classified as their catalogue NUF"""
+        embeddings = version.encoder.encode_uncached(self.smoke_texts)
+        results = version.prototypes.classify(self.smoke_texts, embeddings)
+        predicted = np.asarray([result['predicted_class'] for result in results])
+        return round(float(np.mean(predicted == self.smoke_labels)), 4)
+
+    def activate(self, name):
+        with self._lock:
+            if name not in self._versions:
+                raise KeyError(name)
+            self._active = name
+
+    def unload(self, name):
+        """Drops a version that is not active; requests still using it finish normally"""
+        with self._lock:
+            if name == self._active:
+                raise ValueError('The active model version can not be unloaded')
+            version = self._versions.pop(name)
+        version.close()
+
+    def status(self):
+        return {
+            "active": self._active,
+            "versions": {name: version.describe() for name, version in list(self._versions.items())},
+            "loading": {name: startup.status() for name, startup in list(self._loading.items())},
+            "failed": {name: startup.status() for name, startup in list(self._failed.items())}
+        }
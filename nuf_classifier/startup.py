@@ -0,0 +1,87 @@
+"""
+Background startup of the prediction service: the server binds right away,
+the model, prototypes and indexes are loaded in a thread, and requests are
+only answered once a warm-up batch went through the model.
+"""
+
+import logging
+import threading
+import time
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+
+def warmup_names(entries, count=64):
+    """
+    Representative names for the warm-up batch: catalogue names of every
+    class and of short to long lengths, so tokenizer caches and kernels
+    for the usual shapes are ready before the first real request.
+    """
+    names = sorted(set(entry['Bezeichnung'] for entry in entries if entry.get('Bezeichnung')), key=len)
+    if len(names) <= count:
+        return names
+    step = len(names) / float(count)
+    return [names[int(index * step)] for index in range(count)]
+
+
+class Startup(object):
+    """
+    Runs load(startup) once, in a background thread or in the calling
+    thread, and records how long each step took (see step()).
+    """
+
+    def __init__(self):
+        self.steps = []
+        self.error = None
+        self.seconds = None
+        self._ready = threading.Event()
+        self._thread = None
+
+    @property
+    def ready(self):
+        return self._ready.is_set()
+
+    @contextmanager
+    def step(self, name):
+        """Times one startup step, e.g. with startup.step("model"): ..."""
+        started = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.steps.append((name, time.perf_counter() - started))
+
+    def run(self, load, background=True):
+        if not background:
+            self._run(load, reraise=True)
+            return
+        self._thread = threading.Thread(target=self._run, args=(load,),
+                                        name='nuf-startup', daemon=True)
+        self._thread.start()
+
+    def wait(self, timeout=None):
+        """True once loading finished successfully"""
+        return self._ready.wait(timeout)
+
+    def _run(self, load, reraise=False):
+        started = time.perf_counter()
+        try:
+            load(self)
+        except Exception as e:
+            self.error = f'{type(e).__name__}: {e}'
+            logger.exception('Startup failed')
+            if reraise:
+                raise
+            return
+        self.seconds = time.perf_counter() - started
+        self._ready.set()
+        logger.info('Ready after %.2fs (%s)', self.seconds,
+                    ', '.join(f'{name} {seconds:.2f}s' for name, seconds in self.steps))
+
+    def status(self):
+        return {
+            "ready": self.ready,
+            "error": self.error,
+            "seconds": None if self.seconds is None else round(self.seconds, 3),
+            "steps": {name: round(seconds, 3) for name, seconds in self.steps}
+        }
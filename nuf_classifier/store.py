@@ -0,0 +1,115 @@
+"""
+Persistent SQLite store of room name embeddings, so names seen in earlier
+runs (and other projects) never go through the transformer again.
+"""
+
+from .connection import ProcessConnection
+from .precision import check_precision, pack, unpack
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS embeddings (
+    fingerprint TEXT NOT NULL,
+    name TEXT NOT NULL,
+    vector BLOB NOT NULL,
+    PRIMARY KEY (fingerprint, name)
+)
+"""
+
+# SQLite limits the number of "?" parameters of one statement
+_QUERY_CHUNK = 500
+
+# Names are keyed by text.to_model_text(). Rows of the earlier umlaut-folded
+# keys lack this suffix, so they are ignored and removed by purge_stale().
+_KEY_FORMAT = 'model-text'
+
+
+class EmbeddingStore(object):
+    """
+    Maps room names, as the model sees them, to embedding vectors, stored as float32 or
+    in a compact precision (see precision.py).
+
+    Every row is tagged with the fingerprint of the model weights it was
+    computed with; rows of other fingerprints are ignored and can be removed
+    with purge_stale(). The fingerprint has to cover the precision and any
+    projection of the vectors as well. The connection is opened in the
+    process that uses it, see connection.py.
+    """
+
+    def __init__(self, path, fingerprint, precision='float32'):
+        self.path = path
+        self.fingerprint = fingerprint
+        self._tag = f'{fingerprint}-{_KEY_FORMAT}'
+        self.precision = check_precision(precision)
+        self._connection = ProcessConnection(path, _SCHEMA)
+
+    def __len__(self):
+        with self._connection.lock:
+            return self._connection.get().execute(
+                'SELECT COUNT(*) FROM embeddings WHERE fingerprint = ?',
+                (self._tag,)
+            ).fetchone()[0]
+
+    def get_many(self, names):
+        """{name: float32 vector} for the names present in the store"""
+        names = list(names)
+        found = {}
+        with self._connection.lock:
+            connection = self._connection.get()
+            for start in range(0, len(names), _QUERY_CHUNK):
+                chunk = names[start:start + _QUERY_CHUNK]
+                rows = connection.execute(
+                    'SELECT name, vector FROM embeddings WHERE fingerprint = ? '
+                    'AND name IN ({})'.format(', '.join('?' * len(chunk))),
+                    [self._tag] + chunk
+                )
+                for name, vector in rows:
+                    found[name] = unpack(vector, self.precision)
+        return found
+
+    def put_many(self, items):
+        """Stores (name, vector) pairs, replacing existing ones"""
+        rows = [
+            (self._tag, name, pack(vector, self.precision))
+            for name, vector in items
+        ]
+        with self._connection.lock:
+            connection = self._connection.get()
+            with connection:
+                connection.executemany(
+                    'INSERT OR REPLACE INTO embeddings (fingerprint, name, vector) '
+                    'VALUES (?, ?, ?)',
+                    rows
+                )
+
+    def warm_load(self, cache, limit=None, packed=False):
+        """
+        Fills an LRUCache with the most recently stored names of the current
+        fingerprint, returns the number of loaded entries. packed=True puts
+        the stored bytes into the cache as they are (see CachedEncoder).
+        """
+        limit = cache.maxsize if limit is None else limit
+        if limit <= 0:
+            return 0
+        with self._connection.lock:
+            rows = self._connection.get().execute(
+                'SELECT name, vector FROM embeddings WHERE fingerprint = ? '
+                'ORDER BY rowid DESC LIMIT ?',
+                (self._tag, limit)
+            ).fetchall()
+        # oldest first, so the most recent names end up least likely to be evicted
+        for name, vector in reversed(rows):
+            cache.put(name, vector if packed else unpack(vector, self.precision))
+        return len(rows)
+
+    def purge_stale(self):
+        """Deletes rows computed with other model weights"""
+        with self._connection.lock:
+            connection = self._connection.get()
+            with connection:
+                return connection.execute(
+                    'DELETE FROM embeddings WHERE fingerprint != ?',
+                    (self._tag,)
+                ).rowcount
+
+    def close(self):
+        self._connection.close()
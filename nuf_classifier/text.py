@@ -0,0 +1,23 @@
+"""Room name normalization shared by the service, its caches and indexes."""
+
+import re
+
+_WHITESPACE = re.compile(r'\s+')
+
+
+def fold_umlauts(text):
+    """Same replacements data_preparation.ipynb uses for bezeichnung_no_special_ch"""
+    return re.sub(r'ü', 'u', re.sub(r'ö', 'o', re.sub(r'ä', 'a', re.sub(r'ß', 'ss', text))))
+
+
+def to_model_text(text):
+    """Text as it is passed to the model, which was trained on lower case names"""
+    return _WHITESPACE.sub(' ', text.strip().lower())
+
+
+def normalize_name(text):
+    """
+    Lookup key of a room name: lower case, collapsed whitespace and folded
+    umlauts, so "Büro", "büro " and "buro" share one key.
+    """
+    return fold_umlauts(to_model_text(text))
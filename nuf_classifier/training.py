@@ -0,0 +1,288 @@
+"""
+Fine-tuning of the room name model without materializing all pairs.
+
+model_training.ipynb builds an InputExample for every pair of catalogue rows
+(O(n^2) objects). The samplers here stream O(n) examples per epoch instead:
+every row is an anchor once, with balanced random positives of its own NUF
+class and negatives that are partly mined from the current embeddings
+(the most similar rows of other classes).
+
+    python -m nuf_classifier.training --loss in_batch --epochs 3 \\
+        --output ./fine_tuned_model_for_NUF_clustering_v6
+
+Losses:
+    cosine    (text, text, 0/1) pairs with CosineSimilarityLoss, as in the notebook
+    triplet   (anchor, positive, hard negative) with TripletLoss
+    in_batch  class-balanced batches with BatchHardSoftMarginTripletLoss, every
+              other class in the batch serves as negative
+"""
+
+import argparse
+import json
+import random
+from collections import defaultdict
+
+import numpy as np
+
+try:
+    from torch.utils.data import IterableDataset
+except ImportError:  # samplers can still be iterated (and benchmarked) without torch
+    IterableDataset = object
+
+from .batching import DEFAULT_TOKEN_BUDGET, encode_bucketed
+from .catalogue import CATALOGUE_PATH, load_catalogue
+
+LOSSES = ('cosine', 'triplet', 'in_batch')
+
+
+def _input_example(texts, label):
+    from sentence_transformers import InputExample
+    return InputExample(texts=texts, label=label)
+
+
+def mine_hard_negatives(embeddings, labels, top_k=10, block_size=256):
+    """
+    Indices (n, top_k) of the most similar rows of another class for every
+    row. Similarities are computed block by block, never as a full n x n matrix.
+    top_k is capped at the number of rows outside the largest class, so
+    every row has enough rows of other classes and its own class is never
+    returned.
+    """
+    embeddings = np.asarray(embeddings, dtype=np.float32)
+    embeddings = embeddings / np.maximum(np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-12)
+    labels = np.asarray(labels)
+    top_k = min(top_k, len(labels) - int(np.unique(labels, return_counts=True)[1].max()))
+    if top_k < 1:
+        raise ValueError('At least two classes are needed for negatives')
+    negatives = np.empty((len(labels), top_k), dtype=np.int64)
+    for start in range(0, len(labels), block_size):
+        block = embeddings[start:start + block_size] @ embeddings.T
+        block[labels[start:start + block_size, None] == labels[None, :]] = -np.inf
+        candidates = np.argpartition(-block, top_k - 1, axis=1)[:, :top_k]
+        order = np.argsort(-np.take_along_axis(block, candidates, axis=1), axis=1)
+        negatives[start:start + block_size] = np.take_along_axis(candidates, order, axis=1)
+    return negatives
+
+
+class _AnchorSampler(IterableDataset):
+    """Shared bookkeeping of the pair and triplet samplers"""
+
+    def __init__(self, texts, labels, hard_negatives=None, hard_negative_share=0.5,
+                 seed=42, example_factory=None):
+        if len(texts) != len(labels):
+            raise ValueError('Expected one label per text')
+        self.texts = list(texts)
+        self.labels = list(labels)
+        self.hard_negatives = hard_negatives
+        self.hard_negative_share = hard_negative_share
+        self.seed = seed
+        self.epoch = 0
+        self.make_example = example_factory or _input_example
+        self.members = defaultdict(list)
+        for index, label in enumerate(self.labels):
+            self.members[label].append(index)
+        if len(self.members) < 2:
+            raise ValueError('At least two classes are needed for negatives')
+
+    def _rng(self):
+        rng = random.Random(self.seed + self.epoch)
+        self.epoch += 1
+        return rng
+
+    def _positive(self, rng, anchor):
+        members = self.members[self.labels[anchor]]
+        if len(members) < 2:
+            return None
+        while True:
+            candidate = rng.choice(members)
+            if candidate != anchor:
+                return candidate
+
+    def _negative(self, rng, anchor):
+        if self.hard_negatives is not None and rng.random() < self.hard_negative_share:
+            return int(rng.choice(self.hard_negatives[anchor]))
+        label = self.labels[anchor]
+        while True:
+            candidate = rng.randrange(len(self.labels))
+            if self.labels[candidate] != label:
+                return candidate
+
+
+class PairSampler(_AnchorSampler):
+    """
+    Streams (text, text) examples labelled 1.0 (same NUF) or 0.0, with
+    positives_per_anchor + negatives_per_anchor examples per row and epoch.
+    """
+
+    def __init__(self, texts, labels, positives_per_anchor=1, negatives_per_anchor=1, **kwargs):
+        super(PairSampler, self).__init__(texts, labels, **kwargs)
+        self.positives_per_anchor = positives_per_anchor
+        self.negatives_per_anchor = negatives_per_anchor
+
+    def __len__(self):
+        return len(self.texts) * (self.positives_per_anchor + self.negatives_per_anchor)
+
+    def __iter__(self):
+        rng = self._rng()
+        order = list(range(len(self.texts)))
+        rng.shuffle(order)
+        for anchor in order:
+            for _ in range(self.positives_per_anchor):
+                # rows of single-row classes get a second negative instead
+                positive = self._positive(rng, anchor)
+                if positive is None:
+                    yield self.make_example([self.texts[anchor], self.texts[self._negative(rng, anchor)]], 0.0)
+                else:
+                    yield self.make_example([self.texts[anchor], self.texts[positive]], 1.0)
+            for _ in range(self.negatives_per_anchor):
+                negative = self._negative(rng, anchor)
+                yield self.make_example([self.texts[anchor], self.texts[negative]], 0.0)
+
+
+class TripletSampler(_AnchorSampler):
+    """Streams one (anchor, positive, negative) example per row and epoch"""
+
+    def __len__(self):
+        return sum(len(members) for members in self.members.values() if len(members) > 1)
+
+    def __iter__(self):
+        rng = self._rng()
+        order = list(range(len(self.texts)))
+        rng.shuffle(order)
+        for anchor in order:
+            positive = self._positive(rng, anchor)
+            if positive is None:
+                continue
+            negative = self._negative(rng, anchor)
+            yield self.make_example(
+                [self.texts[anchor], self.texts[positive], self.texts[negative]], 0)
+
+
+class ClassBalancedSampler(_AnchorSampler):
+    """
+    Streams single-text examples with integer class labels such that every
+    consecutive run of classes_per_batch * samples_per_class examples is one
+    batch with samples_per_class rows of each of classes_per_batch classes.
+    Used with a DataLoader of that batch size and no shuffling.
+    """
+
+    def __init__(self, texts, labels, classes_per_batch=8, samples_per_class=4, **kwargs):
+        super(ClassBalancedSampler, self).__init__(texts, labels, **kwargs)
+        self.classes_per_batch = min(classes_per_batch, len(self.members))
+        self.samples_per_class = samples_per_class
+        self.class_ids = {label: index for index, label in enumerate(sorted(self.members))}
+
+    @property
+    def batch_size(self):
+        return self.classes_per_batch * self.samples_per_class
+
+    def __len__(self):
+        return max(1, len(self.texts) // self.batch_size) * self.batch_size
+
+    def __iter__(self):
+        rng = self._rng()
+        classes = sorted(self.members)
+        weights = [len(self.members[label]) for label in classes]
+        for _ in range(len(self) // self.batch_size):
+            chosen = set()
+            while len(chosen) < self.classes_per_batch:
+                chosen.add(rng.choices(classes, weights)[0])
+            for label in sorted(chosen):
+                members = self.members[label]
+                if len(members) >= self.samples_per_class:
+                    rows = rng.sample(members, self.samples_per_class)
+                else:
+                    rows = [rng.choice(members) for _ in range(self.samples_per_class)]
+                for row in rows:
+                    yield self.make_example([self.texts[row]], self.class_ids[label])
+
+
+def build_objective(model, texts, labels, loss='cosine', hard_negatives=None, batch_size=64, seed=42):
+    """DataLoader and loss object for one epoch of model.fit"""
+    from sentence_transformers import losses
+    from torch.utils.data import DataLoader
+
+    if loss == 'cosine':
+        dataset = PairSampler(texts, labels, hard_negatives=hard_negatives, seed=seed)
+        return DataLoader(dataset, batch_size=batch_size), losses.CosineSimilarityLoss(model=model)
+    if loss == 'triplet':
+        dataset = TripletSampler(texts, labels, hard_negatives=hard_negatives, seed=seed)
+        return DataLoader(dataset, batch_size=batch_size), losses.TripletLoss(model=model)
+    if loss == 'in_batch':
+        dataset = ClassBalancedSampler(
+            texts, labels, samples_per_class=max(2, batch_size // len(set(labels))), seed=seed)
+        return (DataLoader(dataset, batch_size=dataset.batch_size),
+                losses.BatchHardSoftMarginTripletLoss(model=model))
+    raise ValueError(f'Unknown loss {loss!r}, expected one of {LOSSES}')
+
+
+def encode(model, texts, batch_size=64, token_budget=DEFAULT_TOKEN_BUDGET):
+    """Normalized embeddings in the order of texts, batched by token length"""
+    return encode_bucketed(model, texts, token_budget, batch_size, normalize_embeddings=True)
+
+
+def class_prototypes(embeddings, labels):
+    """Mean embedding per class, as stored in class_embeddings.json"""
+    labels = np.asarray(labels)
+    return {
+        str(label): np.asarray(embeddings)[labels == label].mean(axis=0)
+        for label in sorted(set(labels.tolist()))
+    }
+
+
+def train(model, rows, loss='cosine', epochs=1, batch_size=64, lr=3e-5, warmup_ratio=0.005,
+          hard_negatives=10, text_column='concat_text', seed=42):
+    """
+    Fine-tunes model on catalogue rows one epoch at a time, re-mining hard
+    negatives from the current embeddings before every epoch.
+    """
+    texts = [row[text_column] for row in rows]
+    labels = [row['NUF'] for row in rows]
+    for epoch in range(epochs):
+        mined = None
+        if hard_negatives and loss != 'in_batch':
+            mined = mine_hard_negatives(encode(model, texts, batch_size), labels, hard_negatives)
+        loader, loss_object = build_objective(
+            model, texts, labels, loss, mined, batch_size, seed + epoch)
+        model.fit(
+            train_objectives=[(loader, loss_object)],
+            epochs=1,
+            warmup_steps=int(warmup_ratio * len(loader)) if epoch == 0 else 0,
+            optimizer_params={'lr': lr},
+            show_progress_bar=True
+        )
+    return model
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Fine-tune the NUF room name model')
+    parser.add_argument('--base-model', default='sentence-transformers/paraphrase-multilingual-mpnet-base-v2')
+    parser.add_argument('--catalogue', default=CATALOGUE_PATH)
+    parser.add_argument('--loss', choices=LOSSES, default='cosine')
+    parser.add_argument('--epochs', type=int, default=1)
+    parser.add_argument('--batch-size', type=int, default=64)
+    parser.add_argument('--lr', type=float, default=3e-5)
+    parser.add_argument('--hard-negatives', type=int, default=10,
+                        help='mined negatives per row, 0 samples negatives at random')
+    parser.add_argument('--output', required=True, help='folder for the fine-tuned model')
+    parser.add_argument('--prototypes', help='also write class prototypes to this JSON file')
+    args = parser.parse_args()
+
+    from sentence_transformers import SentenceTransformer
+
+    rows = load_catalogue(args.catalogue)
+    model = SentenceTransformer(args.base_model)
+    train(model, rows, args.loss, args.epochs, args.batch_size, args.lr,
+          hard_negatives=args.hard_negatives)
+    model.save(args.output)
+
+    if args.prototypes:
+        # prototypes are built from Bezeichnung, as in model_training.ipynb
+        embeddings = encode(model, [row['Bezeichnung'] for row in rows], args.batch_size)
+        prototypes = class_prototypes(embeddings, [row['NUF'] for row in rows])
+        with open(args.prototypes, 'w') as f:
+            json.dump({label: vector.tolist() for label, vector in prototypes.items()}, f)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,32 @@
+"""
+Production entry point of the prediction service.
+
+    python serve.py
+
+Serves app.py with waitress, a multi-threaded WSGI server that also runs on
+Windows next to Revit. The model is loaded once and shared by all threads.
+On Linux several worker processes can be used with gunicorn instead:
+
+    gunicorn -c gunicorn.conf.py
+
+Settings (environment variables):
+    NUF_HOST            interface to bind, default 0.0.0.0
+    NUF_PORT            port, default 5002
+    NUF_THREADS         request threads, default 4
+    NUF_TORCH_THREADS   intra-op threads of torch, see app.py
+"""
+
+import logging
+import os
+
+from waitress import serve
+
+from app import app
+
+HOST = os.environ.get("NUF_HOST", "0.0.0.0")
+PORT = int(os.environ.get("NUF_PORT", 5002))
+THREADS = int(os.environ.get("NUF_THREADS", 4))
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    serve(app, host=HOST, port=PORT, threads=THREADS)
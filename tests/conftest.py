@@ -0,0 +1,9 @@
+import os
+import sys
+
+# pyRevit adds the extension's lib folder to the path, the Revit-free
+# Snippets modules are imported the same way here
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, 'LM_to_RVT.extension', 'lib'))
+# the service package, as for the benchmarks
+sys.path.insert(0, ROOT)
@@ -0,0 +1,165 @@
+from types import SimpleNamespace
+
+from Snippets._element_indexes import DocumentCache, build_door_room_index, build_element_name_index
+
+PHASE = 'New Construction'
+
+
+def element_id(value):
+    return SimpleNamespace(IntegerValue=value)
+
+
+def room(value):
+    return SimpleNamespace(Id=element_id(value))
+
+
+class Door(object):
+    def __init__(self, value, from_room=None, to_room=None, bounding_box=True):
+        self.Id = element_id(value)
+        self.FromRoom = {PHASE: from_room}
+        self.ToRoom = {PHASE: to_room}
+        self._bounding_box = object() if bounding_box else None
+
+    def get_BoundingBox(self, view):
+        return self._bounding_box
+
+
+def test_door_room_index_groups_doors_by_room_and_side():
+    kitchen, hall = room(1), room(2)
+    entrance = Door(10, from_room=hall, to_room=kitchen)
+    exit_ = Door(11, from_room=kitchen)
+    index = build_door_room_index([entrance, exit_], PHASE)
+    assert index == {
+        1: {'from': [exit_], 'to': [entrance]},
+        2: {'from': [entrance], 'to': []},
+    }
+
+
+def test_door_room_index_skips_doors_without_bounding_box():
+    index = build_door_room_index([Door(10, from_room=room(1), bounding_box=False)], PHASE)
+    assert index == {}
+
+
+def test_door_room_index_uses_the_given_phase():
+    door = Door(10, from_room=room(1))
+    door.FromRoom['Existing'] = room(2)
+    door.ToRoom['Existing'] = None
+    assert list(build_door_room_index([door], 'Existing')) == [2]
+
+
+def test_element_name_index_keeps_collector_order():
+    first, second, other = (SimpleNamespace(Name=name) for name in ('Level 1', 'Level 1', 'Level 2'))
+    index = build_element_name_index([first, other, second], lambda element: element.Name)
+    assert index == {'Level 1': [first, second], 'Level 2': [other]}
+
+
+class Event(object):
+    def __init__(self):
+        self.handlers = []
+
+    def __iadd__(self, handler):
+        self.handlers.append(handler)
+        return self
+
+    def __isub__(self, handler):
+        self.handlers.remove(handler)
+        return self
+
+    def fire(self, args):
+        for handler in list(self.handlers):
+            handler(None, args)
+
+
+class Application(object):
+    def __init__(self):
+        self.DocumentChanged = Event()
+        self.DocumentClosing = Event()
+
+
+class Document(object):
+    def __init__(self, application, hash_code=1):
+        self.Application = application
+        self.IsValidObject = True
+        self._hash_code = hash_code
+
+    def GetHashCode(self):
+        return self._hash_code
+
+    def Equals(self, other):
+        return self is other
+
+
+def counting_cache():
+    cache = DocumentCache()
+    builds = []
+
+    def get(doc, key='views'):
+        return cache.get(doc, key, lambda: builds.append(key) or len(builds))
+    return cache, builds, get
+
+
+def test_document_cache_builds_once_per_document_and_key():
+    cache, builds, get = counting_cache()
+    doc = Document(Application())
+    assert get(doc) == get(doc) == 1
+    assert get(doc, 'doors') == 2
+    assert builds == ['views', 'doors']
+
+
+def test_document_cache_watches_an_application_once():
+    application = Application()
+    cache, builds, get = counting_cache()
+    get(Document(application, 1))
+    get(Document(application, 2))
+    assert len(application.DocumentChanged.handlers) == 1
+    assert len(application.DocumentClosing.handlers) == 1
+
+
+def test_document_cache_drops_entries_of_changed_and_closed_documents():
+    application = Application()
+    cache, builds, get = counting_cache()
+    doc, other = Document(application, 1), Document(application, 2)
+    get(doc), get(other)
+
+    application.DocumentChanged.fire(SimpleNamespace(GetDocument=lambda: doc))
+    assert get(doc) == 3
+    assert get(other) == 2
+
+    application.DocumentClosing.fire(SimpleNamespace(Document=other))
+    assert get(other) == 4
+
+
+def test_document_cache_rebuilds_for_a_reopened_document_with_the_same_key():
+    application = Application()
+    cache, builds, get = counting_cache()
+    closed = Document(application, 1)
+    get(closed)
+    closed.IsValidObject = False
+    assert get(Document(application, 1)) == 2
+
+
+def test_document_cache_unsubscribes_once_empty():
+    application = Application()
+    cache, builds, get = counting_cache()
+    doc = Document(application)
+    get(doc)
+    application.DocumentChanged.fire(SimpleNamespace(GetDocument=lambda: doc))
+    assert application.DocumentChanged.handlers == []
+    assert application.DocumentClosing.handlers == []
+
+    get(doc)
+    assert len(application.DocumentChanged.handlers) == 1
+    cache.invalidate()
+    assert application.DocumentChanged.handlers == []
+
+
+def test_document_cache_of_an_earlier_run_is_released_on_close():
+    application = Application()
+    doc = Document(application)
+    for _ in range(3):
+        # a new module load per button run
+        counting_cache()[2](doc)
+    assert len(application.DocumentClosing.handlers) == 3
+    application.DocumentClosing.fire(SimpleNamespace(Document=doc))
+    assert application.DocumentChanged.handlers == []
+    assert application.DocumentClosing.handlers == []
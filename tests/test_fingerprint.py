@@ -0,0 +1,21 @@
+from nuf_classifier.fingerprint import weights_fingerprint
+
+
+def test_saved_onnx_export_keeps_the_fingerprint(tmp_path):
+    (tmp_path / 'model.safetensors').write_bytes(b'weights')
+    before = weights_fingerprint(str(tmp_path))
+    (tmp_path / 'onnx').mkdir()
+    (tmp_path / 'onnx' / 'model.onnx').write_bytes(b'export')
+    assert weights_fingerprint(str(tmp_path)) == before
+
+
+def test_export_only_model_is_hashed_by_content(tmp_path):
+    (tmp_path / 'onnx').mkdir()
+    (tmp_path / 'onnx' / 'model.onnx').write_bytes(b'export')
+    before = weights_fingerprint(str(tmp_path))
+    (tmp_path / 'onnx' / 'model.onnx').write_bytes(b'other export')
+    assert weights_fingerprint(str(tmp_path)) != before
+
+
+def test_models_without_weight_files_differ_by_name():
+    assert weights_fingerprint('org/model-a') != weights_fingerprint('org/model-b')
@@ -0,0 +1,67 @@
+# -*- coding: utf-8 -*-
+
+from nuf_classifier.lexical import LexicalIndex, edit_distance
+
+
+def entry(bezeichnung, nuf, nc='1.1'):
+    return {'Bezeichnung': bezeichnung, 'bezeichnung_no_special_ch': '', 'NUF': nuf, 'NC': nc}
+
+
+CATALOGUE = [
+    entry('Wartehalle', 'NUF_1'),
+    entry('Speiseraum', 'NUF_1'),
+    entry('Lagerhalle', 'NUF_4'),
+    entry('Besprechungsraum', 'NUF_2'),
+    entry('Büro', 'NUF_2'),
+    entry('Technikraum', 'NUF_7'),
+    entry('Technikraum', 'NUF_4'),
+]
+
+
+def test_edit_distance():
+    assert edit_distance('buero', 'buero') == 0
+    assert edit_distance('buero', 'buro') == 1
+    assert edit_distance('kitten', 'sitting') == 3
+    assert edit_distance('', 'abc') == 3
+
+
+def test_edit_distance_stops_beyond_max_distance():
+    assert edit_distance('lager', 'wartehalle', max_distance=2) == 3
+    assert edit_distance('abcdef', 'uvwxyz', max_distance=1) == 2
+
+
+def test_exact_match_is_normalized():
+    match = LexicalIndex(CATALOGUE).lookup('  BÜRO ')
+    assert match['path'] == 'exact'
+    assert match['entry']['NUF'] == 'NUF_2'
+    assert match['similarity'] == 1.0
+
+
+def test_one_typo_in_ten_characters_matches_at_default_similarity():
+    index = LexicalIndex(CATALOGUE)
+    for name, nuf in (('wartehallx', 'NUF_1'), ('speiseraux', 'NUF_1'), ('lagerhallx', 'NUF_4')):
+        match = index.lookup(name)
+        assert match['path'] == 'fuzzy'
+        assert match['entry']['NUF'] == nuf
+        assert abs(match['similarity'] - 0.9) < 1e-9
+
+
+def test_twenty_characters_allow_two_edits():
+    index = LexicalIndex([entry('Besprechungsraum Ost', 'NUF_2')])
+    assert index.lookup('besprechungsraxm oxt')['path'] == 'fuzzy'
+    assert index.lookup('bexprechungsraxm oxt') is None
+
+
+def test_ambiguous_exact_match_is_left_to_the_model():
+    assert LexicalIndex(CATALOGUE).lookup('Technikraum') is None
+
+
+def test_misses_are_memoized():
+    index = LexicalIndex(CATALOGUE)
+    assert index.lookup('Dachterrasse') is None
+    assert index._lookups.get('dachterrasse') is False
+    assert index.lookup('dachterrasse ') is None
+
+
+def test_min_similarity_one_disables_fuzzy_matches():
+    assert LexicalIndex(CATALOGUE, min_similarity=1.0).lookup('wartehallx') is None
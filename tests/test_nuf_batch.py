@@ -0,0 +1,70 @@
+# -*- coding: utf-8 -*-
+
+from Snippets._nuf_batch import RoomAdapter, apply_predictions, classify_rooms
+
+
+class FakeRoom(object):
+    def __init__(self, name):
+        self.name = name
+
+
+class FakeAdapter(RoomAdapter):
+    def __init__(self, rooms):
+        self.rooms = rooms
+        self.applied = []
+
+    def collect_rooms(self):
+        return self.rooms
+
+    def room_name(self, room):
+        return room.name
+
+    def apply(self, assignments):
+        self.applied.extend(assignments)
+        return len(assignments)
+
+
+class FakeClient(object):
+    def __init__(self, results):
+        self.results = results
+        self.requests = []
+
+    def predict_many(self, names):
+        self.requests.append(list(names))
+        return {name: self.results[name] for name in names if name in self.results}
+
+
+def result(nuf, confidence):
+    return {'predicted_class': nuf, 'confidence_percentage': confidence, 'path': 'model'}
+
+
+def test_every_distinct_name_is_sent_once_in_lower_case():
+    rooms = [FakeRoom('Büro'), FakeRoom('Büro'), FakeRoom('WC'), FakeRoom('  '), FakeRoom(None)]
+    client = FakeClient({'büro': result('NUF_2', 40.0), 'wc': result('NUF_7', 90.0)})
+    predictions = classify_rooms(FakeAdapter(rooms), client)
+    assert client.requests == [['büro', 'wc']]
+    assert [(prediction.name, len(prediction.rooms)) for prediction in predictions] == [('Büro', 2), ('WC', 1)]
+
+
+def test_least_confident_first_and_unanswered_names_last():
+    rooms = [FakeRoom('Flur'), FakeRoom('Xyz'), FakeRoom('Büro')]
+    client = FakeClient({'flur': result('NUF_9', 80.0), 'büro': result('NUF_2', 30.0)})
+    predictions = classify_rooms(FakeAdapter(rooms), client)
+    assert [prediction.name for prediction in predictions] == ['Büro', 'Flur', 'Xyz']
+    assert not predictions[-1].answered
+    assert 'no answer' in predictions[-1].label
+
+
+def test_apply_writes_accepted_answers_to_all_rooms_and_skips_unanswered_names():
+    first, second, unknown = FakeRoom('Büro'), FakeRoom('Büro'), FakeRoom('Xyz')
+    adapter = FakeAdapter([first, second, unknown])
+    predictions = classify_rooms(adapter, FakeClient({'büro': result('NUF_2', 30.0)}))
+    assert apply_predictions(adapter, predictions) == 2
+    assert adapter.applied == [(first, 'NUF_2'), (second, 'NUF_2')]
+
+
+def test_apply_without_answers_does_not_call_the_adapter():
+    adapter = FakeAdapter([FakeRoom('Xyz')])
+    predictions = classify_rooms(adapter, FakeClient({}))
+    assert apply_predictions(adapter, predictions) == 0
+    assert adapter.applied == []